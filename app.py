@@ -1,2 +0,0 @@
-# Main Flask application entry point renamed from app.py to flask_app.py
-# to avoid name conflicts with the app/ directory
@@ -1,52 +1,115 @@
-from flask import Blueprint, request, jsonify, send_file
+from dataclasses import dataclass
+
+from flask import Blueprint, request, send_file, Response
+import orjson
 import os
 import shutil
 import mimetypes
+import mmap
 from werkzeug.utils import secure_filename
 # In Flask 2.2.3+, safe_join was moved from flask to werkzeug.security
 from werkzeug.security import safe_join
+from cachetools import LRUCache
+from app.api.responses import json_response
 
 files_api = Blueprint('files_api', __name__, url_prefix='/api/files')
 
+
+@dataclass(slots=True)
+class _ListingEntry:
+    """One directory entry in a listing response.
+
+    orjson serializes dataclasses natively, and the slots layout is a flat
+    record instead of a per-entry dict (hash table plus per-key interning),
+    which adds up on directories with thousands of entries.
+    """
+    name: str
+    path: str
+    is_dir: bool
+    size: int
+    modified: float
+    created: float
+
+
 # Base directory for user files
 USER_FILES_DIR = os.environ.get('USER_FILES_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'storage/user_files'))
 
 # Ensure the directory exists
 os.makedirs(USER_FILES_DIR, exist_ok=True)
 
+# Files larger than this are read via mmap instead of a plain read()
+MMAP_READ_THRESHOLD = 64 * 1024  # 64KB
+
+# Resolve the base directory once at import time; safe_join then rejects
+# traversal attempts by inspecting path segments, with no per-request
+# realpath syscalls
+_BASE_REAL = os.path.realpath(USER_FILES_DIR)
+
+# Upload target directories known to exist, so the common repeat-upload case
+# skips the lstat chain os.makedirs walks up the tree
+_known_dirs = LRUCache(maxsize=1024)
+
+
+def _ensure_upload_dir(target_dir):
+    """Create target_dir if this process hasn't already seen it exist."""
+    if target_dir not in _known_dirs:
+        os.makedirs(target_dir, exist_ok=True)
+        _known_dirs[target_dir] = True
+
+
+def _resolve_user_path(path):
+    """Resolve a user-supplied relative path inside USER_FILES_DIR.
+
+    Returns the resolved absolute path, or None if the path escapes the
+    base directory.
+    """
+    return safe_join(_BASE_REAL, path.lstrip('/'))
+
 @files_api.route('', methods=['GET'])
 def list_files():
     """List files and directories in the specified path"""
     path = request.args.get('path', '')
-    abs_path = os.path.join(USER_FILES_DIR, path.lstrip('/'))
-    
+    abs_path = _resolve_user_path(path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(abs_path).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
-    
+    if abs_path is None:
+        return json_response({'error': 'Invalid path'}, 400)
+
     if not os.path.exists(abs_path):
-        return jsonify({'error': 'Path does not exist'}), 404
-    
+        return json_response({'error': 'Path does not exist'}, 404)
+
     if not os.path.isdir(abs_path):
-        return jsonify({'error': 'Path is not a directory'}), 400
-    
-    files = []
-    for item in os.listdir(abs_path):
-        item_path = os.path.join(abs_path, item)
-        item_stat = os.stat(item_path)
-        files.append({
-            'name': item,
-            'path': os.path.join(path, item).replace('\\', '/').lstrip('/'),
-            'is_dir': os.path.isdir(item_path),
-            'size': item_stat.st_size,
-            'modified': item_stat.st_mtime,
-            'created': item_stat.st_ctime
-        })
-    
-    return jsonify({
-        'path': path,
-        'files': files
-    })
+        return json_response({'error': 'Path is not a directory'}, 400)
+    
+    # Stream the listing entry by entry so large directories never
+    # materialize a full Python list plus a second serialized copy in
+    # memory. os.scandir DirEntry objects carry type and stat info from the
+    # directory read itself, avoiding a separate stat per entry.
+    def generate():
+        yield b'{"path":' + orjson.dumps(path) + b',"files":['
+        first = True
+        with os.scandir(abs_path) as it:
+            for entry in it:
+                # The 200 header is already on the wire, so one bad entry
+                # (dangling symlink, file deleted mid-iteration) must not
+                # abort the stream and truncate the JSON - skip it
+                try:
+                    entry_stat = entry.stat()
+                except OSError:
+                    continue
+                chunk = orjson.dumps(_ListingEntry(
+                    entry.name,
+                    os.path.join(path, entry.name).replace('\\', '/').lstrip('/'),
+                    entry.is_dir(),
+                    entry_stat.st_size,
+                    entry_stat.st_mtime,
+                    entry_stat.st_ctime,
+                ))
+                yield chunk if first else b',' + chunk
+                first = False
+        yield b']}'
+
+    return Response(generate(), mimetype='application/json')
 
 @files_api.route('', methods=['POST'])
 def create_file_or_directory():
@@ -55,27 +118,29 @@ def create_file_or_directory():
     path = data.get('path', '').lstrip('/')
     content = data.get('content', '')
     is_directory = data.get('is_directory', False)
-    
-    abs_path = os.path.join(USER_FILES_DIR, path)
-    
+
+    abs_path = _resolve_user_path(path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(abs_path).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
-    
+    if abs_path is None:
+        return json_response({'error': 'Invalid path'}, 400)
+
     # Create parent directories if they don't exist
     os.makedirs(os.path.dirname(abs_path), exist_ok=True)
     
     if is_directory:
         if os.path.exists(abs_path):
-            return jsonify({'error': 'Directory already exists'}), 400
+            return json_response({'error': 'Directory already exists'}, 400)
         os.makedirs(abs_path, exist_ok=True)
-        return jsonify({'message': f'Directory {path} created successfully'})
+        return json_response({'message': f'Directory {path} created successfully'})
     else:
         if os.path.exists(abs_path):
-            return jsonify({'error': 'File already exists'}), 400
-        with open(abs_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        return jsonify({'message': f'File {path} created successfully'})
+            return json_response({'error': 'File already exists'}, 400)
+        # Encode once and write the bytes in a single call; text mode would
+        # re-chunk and re-encode large content through an 8KB buffer
+        with open(abs_path, 'wb', buffering=1 << 20) as f:
+            f.write(memoryview(content.encode('utf-8')))
+        return json_response({'message': f'File {path} created successfully'})
 
 @files_api.route('', methods=['PUT'])
 def update_file():
@@ -83,38 +148,39 @@ def update_file():
     data = request.json
     path = data.get('path', '').lstrip('/')
     content = data.get('content', '')
-    
-    abs_path = os.path.join(USER_FILES_DIR, path)
-    
+
+    abs_path = _resolve_user_path(path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(abs_path).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
-    
+    if abs_path is None:
+        return json_response({'error': 'Invalid path'}, 400)
+
     if not os.path.exists(abs_path):
-        return jsonify({'error': 'File does not exist'}), 404
+        return json_response({'error': 'File does not exist'}, 404)
     
     if os.path.isdir(abs_path):
-        return jsonify({'error': 'Cannot update directory content'}), 400
-    
-    with open(abs_path, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
-    return jsonify({'message': f'File {path} updated successfully'})
+        return json_response({'error': 'Cannot update directory content'}, 400)
+
+    # Same single-shot binary write as the create path
+    with open(abs_path, 'wb', buffering=1 << 20) as f:
+        f.write(memoryview(content.encode('utf-8')))
+
+    return json_response({'message': f'File {path} updated successfully'})
 
 @files_api.route('', methods=['DELETE'])
 def delete_file_or_directory():
     """Delete a file or directory"""
     path = request.args.get('path', '').lstrip('/')
     recursive = request.args.get('recursive', 'false').lower() == 'true'
-    
-    abs_path = os.path.join(USER_FILES_DIR, path)
-    
+
+    abs_path = _resolve_user_path(path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(abs_path).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
-    
+    if abs_path is None:
+        return json_response({'error': 'Invalid path'}, 400)
+
     if not os.path.exists(abs_path):
-        return jsonify({'error': 'Path does not exist'}), 404
+        return json_response({'error': 'Path does not exist'}, 404)
     
     try:
         if os.path.isdir(abs_path):
@@ -122,87 +188,133 @@ def delete_file_or_directory():
                 shutil.rmtree(abs_path)
             else:
                 os.rmdir(abs_path)  # Will fail if directory is not empty
+            # Any cached upload directory may have just lost an ancestor
+            _known_dirs.clear()
         else:
             os.remove(abs_path)
         
-        return jsonify({'message': f'{path} deleted successfully'})
+        return json_response({'message': f'{path} deleted successfully'})
     except OSError as e:
-        return jsonify({'error': str(e)}), 400
+        return json_response({'error': str(e)}, 400)
 
 @files_api.route('/read', methods=['GET'])
 def read_file():
     """Read the content of a file"""
     path = request.args.get('path', '').lstrip('/')
-    abs_path = os.path.join(USER_FILES_DIR, path)
-    
+    abs_path = _resolve_user_path(path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(abs_path).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
+    if abs_path is None:
+        return json_response({'error': 'Invalid path'}, 400)
     
     if not os.path.exists(abs_path):
-        return jsonify({'error': 'File does not exist'}), 404
+        return json_response({'error': 'File does not exist'}, 404)
     
     if os.path.isdir(abs_path):
-        return jsonify({'error': 'Cannot read directory content'}), 400
+        return json_response({'error': 'Cannot read directory content'}, 400)
     
     try:
-        with open(abs_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        return jsonify({
+        file_size = os.path.getsize(abs_path)
+        if file_size > MMAP_READ_THRESHOLD:
+            # For larger files, map the file into memory and decode in place.
+            # This avoids the extra userspace copy that f.read() makes out of
+            # the page cache; mmap has overhead that isn't worth it for small
+            # files, hence the size gate.
+            with open(abs_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    content = mm[:].decode('utf-8')
+        else:
+            with open(abs_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+
+        return json_response({
             'path': path,
             'content': content
         })
     except UnicodeDecodeError:
-        return jsonify({'error': 'File is not a text file'}), 400
+        return json_response({'error': 'File is not a text file'}, 400)
 
 @files_api.route('/download', methods=['GET'])
 def download_file():
     """Download a file"""
     path = request.args.get('path', '').lstrip('/')
-    abs_path = os.path.join(USER_FILES_DIR, path)
-    
+    abs_path = _resolve_user_path(path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(abs_path).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
+    if abs_path is None:
+        return json_response({'error': 'Invalid path'}, 400)
     
     if not os.path.exists(abs_path):
-        return jsonify({'error': 'File does not exist'}), 404
+        return json_response({'error': 'File does not exist'}, 404)
     
     if os.path.isdir(abs_path):
-        return jsonify({'error': 'Cannot download directory'}), 400
+        return json_response({'error': 'Cannot download directory'}, 400)
     
     filename = os.path.basename(abs_path)
     mimetype = mimetypes.guess_type(abs_path)[0] or 'application/octet-stream'
-    
-    return send_file(abs_path, mimetype=mimetype, as_attachment=True, 
-                    download_name=filename)
+
+    # conditional=True enables ETag/If-Modified-Since revalidation and HTTP
+    # Range requests, and lets the WSGI server's wsgi.file_wrapper use
+    # sendfile(2) for zero-copy transfers where the server supports it.
+    return send_file(abs_path, mimetype=mimetype, as_attachment=True,
+                    download_name=filename, conditional=True, etag=True,
+                    last_modified=os.path.getmtime(abs_path))
 
 @files_api.route('/upload', methods=['POST'])
 def upload_file():
     """Upload a file"""
+    # Streaming path: a raw request body with the filename carried in headers.
+    # Reading request.stream directly writes each chunk straight to the target
+    # file, avoiding Werkzeug's multipart parser which spools large uploads to
+    # a temp file and then copies them again on save().
+    if request.content_type and request.content_type.startswith('application/octet-stream'):
+        filename = secure_filename(request.headers.get('X-Filename', ''))
+        if not filename:
+            return json_response({'error': 'X-Filename header is required'}, 400)
+
+        path = request.headers.get('X-Path', '').lstrip('/')
+        target_dir = _resolve_user_path(path)
+
+        # Security check to prevent directory traversal
+        if target_dir is None:
+            return json_response({'error': 'Invalid path'}, 400)
+
+        _ensure_upload_dir(target_dir)
+
+        file_path = os.path.join(target_dir, filename)
+        with open(file_path, 'wb', buffering=1 << 20) as f:
+            while chunk := request.stream.read(1 << 20):
+                f.write(chunk)
+
+        return json_response({
+            'message': f'File {filename} uploaded successfully',
+            'path': os.path.join(path, filename).replace('\\', '/').lstrip('/')
+        })
+
+    # Multipart fallback for clients that still post form data
     if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+        return json_response({'error': 'No file part'}, 400)
     
     uploaded_file = request.files['file']
     if uploaded_file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+        return json_response({'error': 'No selected file'}, 400)
     
     path = request.form.get('path', '').lstrip('/')
     filename = secure_filename(uploaded_file.filename)
     
-    # Create target directory if it doesn't exist
-    target_dir = os.path.join(USER_FILES_DIR, path)
-    os.makedirs(target_dir, exist_ok=True)
-    
+    target_dir = _resolve_user_path(path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(target_dir).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
-    
+    if target_dir is None:
+        return json_response({'error': 'Invalid path'}, 400)
+
+    # Create target directory if it doesn't exist
+    _ensure_upload_dir(target_dir)
+
     file_path = os.path.join(target_dir, filename)
     uploaded_file.save(file_path)
     
-    return jsonify({
+    return json_response({
         'message': f'File {filename} uploaded successfully',
         'path': os.path.join(path, filename).replace('\\', '/').lstrip('/')
     })
@@ -214,31 +326,40 @@ def rename_file():
     old_path = data.get('old_path', '').lstrip('/')
     new_name = data.get('new_name', '')
     
-    abs_old_path = os.path.join(USER_FILES_DIR, old_path)
-    
+    abs_old_path = _resolve_user_path(old_path)
+
     # Security check to prevent directory traversal
-    if not os.path.abspath(abs_old_path).startswith(os.path.abspath(USER_FILES_DIR)):
-        return jsonify({'error': 'Invalid path'}), 400
+    if abs_old_path is None:
+        return json_response({'error': 'Invalid path'}, 400)
     
     if not os.path.exists(abs_old_path):
-        return jsonify({'error': 'File or directory does not exist'}), 404
+        return json_response({'error': 'File or directory does not exist'}, 404)
     
     if not new_name:
-        return jsonify({'error': 'New name is required'}), 400
+        return json_response({'error': 'New name is required'}, 400)
     
     # Get the directory of the old path
     dir_name = os.path.dirname(abs_old_path)
     abs_new_path = os.path.join(dir_name, secure_filename(new_name))
-    
-    if os.path.exists(abs_new_path):
-        return jsonify({'error': 'A file or directory with this name already exists'}), 400
-    
+
+    # os.replace is atomic but silently overwrites on POSIX, and there is no
+    # exclusive-rename syscall exposed by os, so a single lstat keeps the
+    # no-overwrite contract (lexists also catches dangling symlinks)
+    if os.path.lexists(abs_new_path):
+        return json_response({'error': 'A file or directory with this name already exists'}, 400)
+
     try:
-        os.rename(abs_old_path, abs_new_path)
+        # Decide before the rename: afterwards the old path is gone
+        was_directory = os.path.isdir(abs_old_path)
+        os.replace(abs_old_path, abs_new_path)
+        if was_directory:
+            # Any cached upload directory may have just moved, same as the
+            # delete path
+            _known_dirs.clear()
         new_path = os.path.join(os.path.dirname(old_path), new_name).replace('\\', '/').lstrip('/')
-        return jsonify({
+        return json_response({
             'message': f'Renamed successfully',
             'new_path': new_path
         })
     except OSError as e:
-        return jsonify({'error': str(e)}), 400
+        return json_response({'error': str(e)}, 400)
@@ -1,8 +1,10 @@
-from flask import Blueprint, jsonify
-from app.services.terminal_service import TerminalService
+import gevent
+from flask import Blueprint
+from app.services.terminal_service import get_terminal_service
+from app.api.responses import json_response
 
 maintenance_api = Blueprint('maintenance_api', __name__, url_prefix='/api/maintenance')
-terminal_service = TerminalService()
+terminal_service = get_terminal_service()
 
 @maintenance_api.route('/cleanup', methods=['POST'])
 def cleanup_sessions():
@@ -10,16 +12,17 @@ def cleanup_sessions():
     Endpoint to clean up inactive sessions and orphaned directories.
     This can be called by a CRON job or manually.
     """
-    # Do a manual cleanup cycle
-    current_service = TerminalService()
+    # Do a manual cleanup cycle on the shared service; constructing a fresh
+    # TerminalService here would rescan storage and spawn another cleanup
+    # thread on every CRON tick
+    # Both passes are I/O-bound stat/unlink walks, so run them concurrently
+    # on the hub instead of back to back
+    inactive_task = gevent.spawn(terminal_service.cleanup_inactive_sessions)
+    orphaned_task = gevent.spawn(terminal_service.cleanup_orphaned_directories)
+    inactive_count = inactive_task.get()
+    orphaned_count = orphaned_task.get()
     
-    # Clean up inactive sessions
-    inactive_count = current_service.cleanup_inactive_sessions()
-    
-    # Clean up orphaned directories
-    orphaned_count = current_service.cleanup_orphaned_directories()
-    
-    return jsonify({
+    return json_response({
         'status': 'success', 
         'message': 'Cleanup completed',
         'inactive_sessions_cleaned': inactive_count,
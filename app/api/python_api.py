@@ -1,10 +1,14 @@
 import subprocess
-import json
 import sys
 import os
 import re
 import venv
-from flask import Blueprint, request, jsonify, current_app
+import importlib.metadata
+import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from app.api.responses import json_response
+from flask import Blueprint, request, current_app
 
 python_api = Blueprint('python_api', __name__, url_prefix='/api/python')
 
@@ -14,27 +18,47 @@ VENV_DIR = os.environ.get('VENV_DIR', os.path.join(os.path.dirname(os.path.dirna
 # Ensure the directory exists
 os.makedirs(VENV_DIR, exist_ok=True)
 
+# Short-lived caches so repeated UI polls don't rescan metadata or re-hit
+# PyPI on every call; the package list cache is invalidated on install and
+# uninstall
+_packages_cache = TTLCache(maxsize=1, ttl=30)
+_search_cache = TTLCache(maxsize=64, ttl=60)
+
+# One pooled keep-alive session for PyPI lookups, so each search doesn't pay
+# a fresh TCP+TLS handshake to pypi.org
+_pypi_session = requests.Session()
+_pypi_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 @python_api.route('/packages', methods=['GET'])
 def list_packages():
     """List all installed Python packages"""
+    packages = _packages_cache.get('packages')
+    if packages is not None:
+        return json_response({'packages': packages})
+
     try:
-        result = subprocess.run(
-            [sys.executable, '-m', 'pip', 'list', '--format=json'],
-            capture_output=True,
-            text=True,
-            check=True
+        # Read installed package metadata in-process instead of forking a
+        # whole interpreter for `pip list` (100-300ms of startup per call)
+        packages = sorted(
+            ({'name': dist.metadata['Name'], 'version': dist.version}
+             for dist in importlib.metadata.distributions()),
+            key=lambda pkg: (pkg['name'] or '').lower()
         )
-        packages = json.loads(result.stdout)
-        return jsonify({'packages': packages})
-    except subprocess.CalledProcessError as e:
-        return jsonify({'error': e.stderr}), 500
+        _packages_cache['packages'] = packages
+        return json_response({'packages': packages})
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
 
 @python_api.route('/packages/search', methods=['GET'])
 def search_packages():
     """Search for Python packages on PyPI"""
     query = request.args.get('query', '')
     if not query:
-        return jsonify({'error': 'Query parameter is required'}), 400
+        return json_response({'error': 'Query parameter is required'}, 400)
+
+    cached = _search_cache.get(query)
+    if cached is not None:
+        return json_response(cached)
 
     try:
         result = subprocess.run(
@@ -45,11 +69,10 @@ def search_packages():
         
         # pip search is deprecated, so as a fallback we use a simple API call to PyPI
         if 'ERROR: DEPRECATION:' in result.stderr:
-            import requests
-            response = requests.get(f'https://pypi.org/pypi/{query}/json')
+            response = _pypi_session.get(f'https://pypi.org/pypi/{query}/json')
             if response.status_code == 200:
                 package_data = response.json()
-                return jsonify({
+                result = {
                     'name': package_data['info']['name'],
                     'version': package_data['info']['version'],
                     'summary': package_data['info']['summary'],
@@ -57,16 +80,18 @@ def search_packages():
                     'author': package_data['info']['author'],
                     'author_email': package_data['info']['author_email'],
                     'homepage': package_data['info']['home_page'],
-                })
+                }
+                _search_cache[query] = result
+                return json_response(result)
             
-            # If specific package not found, search PyPI simple index
-            response = requests.get('https://pypi.org/simple/')
-            if response.status_code == 200:
-                packages = re.findall(r'<a[^>]*>([^<]+)</a>', response.text)
-                matches = [pkg for pkg in packages if query.lower() in pkg.lower()]
-                return jsonify({'packages': matches[:20]})  # Limit to 20 results
-            
-            return jsonify({'error': 'Package search failed'}), 500
+            # If the exact package wasn't found, probe the PEP 503 simple
+            # index for the normalized name rather than downloading the full
+            # ~20MB package index and regex-scanning every <a> tag
+            normalized = re.sub(r'[-_.]+', '-', query).lower()
+            response = _pypi_session.get(f'https://pypi.org/simple/{normalized}/')
+            result = {'packages': [normalized] if response.status_code == 200 else []}
+            _search_cache[query] = result
+            return json_response(result)
             
         # Parse pip search output
         packages = []
@@ -88,10 +113,12 @@ def search_packages():
         
         if current_package:
             packages.append(current_package)
-            
-        return jsonify({'packages': packages})
+
+        result = {'packages': packages}
+        _search_cache[query] = result
+        return json_response(result)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @python_api.route('/packages', methods=['POST'])
 def install_package():
@@ -100,24 +127,26 @@ def install_package():
     package_name = data.get('package')
     
     if not package_name:
-        return jsonify({'error': 'Package name is required'}), 400
+        return json_response({'error': 'Package name is required'}, 400)
     
     # Clean the package name to prevent command injection
     package_name = re.sub(r'[^a-zA-Z0-9._-]', '', package_name)
     
     try:
         result = subprocess.run(
-            [sys.executable, '-m', 'pip', 'install', package_name],
+            [sys.executable, '-m', 'pip', 'install',
+             '--disable-pip-version-check', '--no-input', package_name],
             capture_output=True,
             text=True,
             check=True
         )
-        return jsonify({
+        _packages_cache.clear()
+        return json_response({
             'message': f'Package {package_name} installed successfully',
             'details': result.stdout
         })
     except subprocess.CalledProcessError as e:
-        return jsonify({'error': e.stderr}), 500
+        return json_response({'error': e.stderr}, 500)
 
 @python_api.route('/packages', methods=['DELETE'])
 def uninstall_package():
@@ -125,24 +154,26 @@ def uninstall_package():
     package_name = request.args.get('package')
     
     if not package_name:
-        return jsonify({'error': 'Package name is required'}), 400
+        return json_response({'error': 'Package name is required'}, 400)
     
     # Clean the package name to prevent command injection
     package_name = re.sub(r'[^a-zA-Z0-9._-]', '', package_name)
     
     try:
         result = subprocess.run(
-            [sys.executable, '-m', 'pip', 'uninstall', '-y', package_name],
+            [sys.executable, '-m', 'pip', 'uninstall', '-y',
+             '--disable-pip-version-check', '--no-input', package_name],
             capture_output=True,
             text=True,
             check=True
         )
-        return jsonify({
+        _packages_cache.clear()
+        return json_response({
             'message': f'Package {package_name} uninstalled successfully',
             'details': result.stdout
         })
     except subprocess.CalledProcessError as e:
-        return jsonify({'error': e.stderr}), 500
+        return json_response({'error': e.stderr}, 500)
 
 @python_api.route('/packages/info', methods=['GET'])
 def package_info():
@@ -150,31 +181,18 @@ def package_info():
     package_name = request.args.get('package')
     
     if not package_name:
-        return jsonify({'error': 'Package name is required'}), 400
+        return json_response({'error': 'Package name is required'}, 400)
     
     try:
-        # Check if package is installed
-        result = subprocess.run(
-            [sys.executable, '-m', 'pip', 'show', package_name],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode != 0:
-            return jsonify({'error': 'Package not found'}), 404
-        
-        # Parse the output
-        lines = result.stdout.strip().split('\n')
-        info = {}
-        
-        for line in lines:
-            if ': ' in line:
-                key, value = line.split(': ', 1)
-                info[key.lower()] = value
-        
-        return jsonify(info)
+        # Look up the installed distribution directly instead of shelling
+        # out to `pip show` and parsing its text output
+        dist = importlib.metadata.distribution(package_name)
+        info = {key.lower(): value for key, value in dist.metadata.items()}
+        return json_response(info)
+    except importlib.metadata.PackageNotFoundError:
+        return json_response({'error': 'Package not found'}, 404)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @python_api.route('/venvs', methods=['GET'])
 def list_venvs():
@@ -186,9 +204,9 @@ def list_venvs():
             if os.path.isdir(venv_path) and os.path.exists(os.path.join(venv_path, 'pyvenv.cfg')):
                 venvs.append(item)
         
-        return jsonify({'venvs': venvs})
+        return json_response({'venvs': venvs})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @python_api.route('/venvs', methods=['POST'])
 def create_venv():
@@ -197,7 +215,7 @@ def create_venv():
     name = data.get('name')
     
     if not name:
-        return jsonify({'error': 'Virtual environment name is required'}), 400
+        return json_response({'error': 'Virtual environment name is required'}, 400)
     
     # Sanitize name to prevent path traversal
     name = re.sub(r'[^a-zA-Z0-9_-]', '', name)
@@ -205,13 +223,13 @@ def create_venv():
     venv_path = os.path.join(VENV_DIR, name)
     
     if os.path.exists(venv_path):
-        return jsonify({'error': f'Virtual environment {name} already exists'}), 400
+        return json_response({'error': f'Virtual environment {name} already exists'}, 400)
     
     try:
         venv.create(venv_path, with_pip=True)
-        return jsonify({'message': f'Virtual environment {name} created successfully'})
+        return json_response({'message': f'Virtual environment {name} created successfully'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @python_api.route('/venvs', methods=['DELETE'])
 def delete_venv():
@@ -219,7 +237,7 @@ def delete_venv():
     name = request.args.get('name')
     
     if not name:
-        return jsonify({'error': 'Virtual environment name is required'}), 400
+        return json_response({'error': 'Virtual environment name is required'}, 400)
     
     # Sanitize name to prevent path traversal
     name = re.sub(r'[^a-zA-Z0-9_-]', '', name)
@@ -227,14 +245,14 @@ def delete_venv():
     venv_path = os.path.join(VENV_DIR, name)
     
     if not os.path.exists(venv_path):
-        return jsonify({'error': f'Virtual environment {name} does not exist'}), 404
+        return json_response({'error': f'Virtual environment {name} does not exist'}, 404)
     
     try:
         import shutil
         shutil.rmtree(venv_path)
-        return jsonify({'message': f'Virtual environment {name} deleted successfully'})
+        return json_response({'message': f'Virtual environment {name} deleted successfully'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @python_api.route('/run', methods=['POST'])
 def run_python_code():
@@ -243,32 +261,27 @@ def run_python_code():
     code = data.get('code')
     
     if not code:
-        return jsonify({'error': 'Python code is required'}), 400
+        return json_response({'error': 'Python code is required'}, 400)
     
     try:
-        # Create a temporary file
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix='.py', delete=False) as f:
-            f.write(code.encode('utf-8'))
-            temp_file = f.name
-        
-        # Run the code
+        # Pipe the code to the interpreter over stdin instead of round-tripping
+        # through a temp file (open/write/unlink per call, plus leaked files if
+        # the request dies). -I isolates the child from user site-packages,
+        # which also speeds up interpreter startup.
         result = subprocess.run(
-            [sys.executable, temp_file],
+            [sys.executable, '-I', '-'],
+            input=code,
             capture_output=True,
             text=True,
             timeout=30  # Timeout after 30 seconds to prevent long-running scripts
         )
-        
-        # Clean up
-        os.unlink(temp_file)
-        
-        return jsonify({
+
+        return json_response({
             'stdout': result.stdout,
             'stderr': result.stderr,
             'returncode': result.returncode
         })
     except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Script execution timed out'}), 408
+        return json_response({'error': 'Script execution timed out'}, 408)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
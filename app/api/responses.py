@@ -0,0 +1,12 @@
+import orjson
+from flask import Response
+
+
+def json_response(obj, status=200):
+    """Serialize obj with orjson and wrap it in a JSON response.
+
+    orjson is a C-implemented encoder that is several times faster than the
+    stdlib json used by Flask's jsonify, which matters for large responses
+    like directory listings and package lists.
+    """
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
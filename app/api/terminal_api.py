@@ -1,15 +1,20 @@
-from flask import Blueprint, request, jsonify
-from app.services.terminal_service import TerminalService
+from flask import Blueprint, request
+from app.services.terminal_service import get_terminal_service
+from app.api.responses import json_response
 import os
 
 terminal_api = Blueprint('terminal_api', __name__, url_prefix='/api/terminal')
-terminal_service = TerminalService()
+terminal_service = get_terminal_service()
+
+# Process environment snapshotted once at import; per-request merges build
+# on this instead of copying os.environ on every session create
+_BASE_ENV = dict(os.environ)
 
 @terminal_api.route('/sessions', methods=['GET'])
 def list_sessions():
     """List all active terminal sessions"""
     sessions = terminal_service.get_all_sessions()
-    return jsonify({
+    return json_response({
         'sessions': [session.to_dict() for session in sessions]
     })
 
@@ -23,9 +28,9 @@ def create_session():
     cwd = data.get('cwd', os.environ.get('HOME', '/'))
     env = data.get('env', {})
     
-    # Merge with current environment
-    environment = os.environ.copy()
-    environment.update(env)
+    # Merge with the snapshotted base environment in one C-level dict
+    # build; the session takes ownership of the result
+    environment = {**_BASE_ENV, **env}
     
     try:
         session = terminal_service.create_session(
@@ -35,17 +40,17 @@ def create_session():
             cols=cols,
             rows=rows
         )
-        return jsonify(session.to_dict()), 201
+        return json_response(session.to_dict(), 201)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @terminal_api.route('/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
     """Get information about a specific terminal session"""
     session = terminal_service.get_session(session_id)
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
-    return jsonify(session.to_dict())
+        return json_response({'error': 'Session not found'}, 404)
+    return json_response(session.to_dict())
 
 @terminal_api.route('/sessions/<session_id>/size', methods=['POST'])
 def resize_session(session_id):
@@ -55,19 +60,19 @@ def resize_session(session_id):
     rows = data.get('rows')
     
     if not cols or not rows:
-        return jsonify({'error': 'Both cols and rows are required'}), 400
+        return json_response({'error': 'Both cols and rows are required'}, 400)
     
     try:
         terminal_service.resize_session(session_id, cols, rows)
-        return jsonify({'status': 'success'})
+        return json_response({'status': 'success'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @terminal_api.route('/sessions/<session_id>', methods=['DELETE'])
 def terminate_session(session_id):
     """Terminate a terminal session"""
     try:
         terminal_service.terminate_session(session_id)
-        return jsonify({'status': 'success'})
+        return json_response({'status': 'success'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
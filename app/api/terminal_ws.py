@@ -1,9 +1,13 @@
 from flask_socketio import emit, join_room, leave_room
-from app.services.terminal_service import TerminalService
+from app.services.terminal_service import get_terminal_service
 
-terminal_service = TerminalService()
+terminal_service = get_terminal_service()
 
 def register_socket_events(socketio):
+    # Hand the server to the service so PTY output is emitted from a
+    # Socket.IO background task instead of the reader thread
+    terminal_service.attach_socketio(socketio)
+
     @socketio.on('connect')
     def handle_connect():
         """Handle client connection"""
@@ -17,18 +21,27 @@ def register_socket_events(socketio):
 
     @socketio.on('join')
     def handle_join(data):
-        """Join a specific terminal session room"""
+        """Join a specific terminal session room.
+
+        Clients that pass ``binary: true`` subscribe to raw ``output_bin``
+        frames (``session_id + b'\\0' + utf8 bytes``) instead of the JSON
+        ``output`` event, skipping JSON string-escaping of escape-sequence
+        heavy terminal output. Default remains the JSON event.
+        """
         session_id = data.get('session_id')
         if not session_id:
             emit('error', {'message': 'Session ID is required'})
             return
-        
+
         session = terminal_service.get_session(session_id)
         if not session:
             emit('error', {'message': 'Session not found'})
             return
-        
-        join_room(session_id)
+
+        if data.get('binary'):
+            join_room(session_id + ':bin')
+        else:
+            join_room(session_id)
         emit('joined', {
             'session_id': session_id,
             'status': 'joined',
@@ -41,6 +54,7 @@ def register_socket_events(socketio):
         session_id = data.get('session_id')
         if session_id:
             leave_room(session_id)
+            leave_room(session_id + ':bin')
             emit('left', {'status': 'left', 'session_id': session_id})
 
     @socketio.on('input')
@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify, current_app
-from app.services.terminal_service import TerminalService
+from flask import Blueprint, request, current_app
+from app.services.terminal_service import get_terminal_service
 from app.services.webdav_service import WebDAVService
+from app.api.responses import json_response
 
 webdav_api = Blueprint('webdav_api', __name__, url_prefix='/api/webdav')
 
 # Get singleton instances
-terminal_service = TerminalService()
+terminal_service = get_terminal_service()
 
 # Initialize WebDAV service as a global variable 
 # The actual mounting happens in flask_app.py
@@ -19,7 +20,7 @@ def webdav_info():
     scheme = request.environ.get('wsgi.url_scheme', 'http')
     base_url = f"{scheme}://{host}"
     
-    return jsonify({
+    return json_response({
         'status': 'running' if webdav_service.running else 'stopped',
         'webdav_url': f"{base_url}/webdav",
         'mount_path': '/webdav'
@@ -31,20 +32,20 @@ def get_credentials():
     session_id = request.args.get('session_id')
     
     if not session_id:
-        return jsonify({'error': 'Session ID is required'}), 400
+        return json_response({'error': 'Session ID is required'}, 400)
     
     # Check if session exists
     session = terminal_service.get_session(session_id)
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
+        return json_response({'error': 'Session not found'}, 404)
     
     # Get or create credentials for this session
     credentials = webdav_service.add_session(session_id)
     
     if not credentials:
-        return jsonify({'error': 'Failed to create WebDAV credentials'}), 500
+        return json_response({'error': 'Failed to create WebDAV credentials'}, 500)
     
-    return jsonify({
+    return json_response({
         'credentials': credentials,
         'instructions': [
             "To access your files via WebDAV:",
@@ -79,17 +80,17 @@ def disable_webdav():
     session_id = request.json.get('session_id')
     
     if not session_id:
-        return jsonify({'error': 'Session ID is required'}), 400
+        return json_response({'error': 'Session ID is required'}, 400)
     
     # Check if session exists
     session = terminal_service.get_session(session_id)
     if not session:
-        return jsonify({'error': 'Session not found'}), 404
+        return json_response({'error': 'Session not found'}, 404)
     
     # Remove credentials for this session
     webdav_service.remove_session(session_id)
     
-    return jsonify({
+    return json_response({
         'status': 'success',
         'message': 'WebDAV access disabled for this session'
     })
@@ -100,12 +101,12 @@ def get_status():
     session_id = request.args.get('session_id')
     
     if not session_id:
-        return jsonify({'error': 'Session ID is required'}), 400
+        return json_response({'error': 'Session ID is required'}, 400)
     
     # Check if credentials exist for this session
     has_credentials = session_id in webdav_service.credentials
     
-    return jsonify({
+    return json_response({
         'session_id': session_id,
         'webdav_enabled': has_credentials
     })
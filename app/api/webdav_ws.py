@@ -1,21 +1,52 @@
 import os
+import fcntl
+import shlex
 import subprocess
-import threading
 import json
 import logging
 import time
-from flask_socketio import emit, join_room, leave_room
-from app.services.terminal_service import TerminalService
+import uuid
+from flask import request
+from flask_socketio import emit
+from app.services.terminal_service import get_terminal_service
 from app.services.webdav_service import WebDAVService
 from app.api.webdav_api import get_webdav_service
 
 # Get singleton instances
-terminal_service = TerminalService()
+terminal_service = get_terminal_service()
 webdav_service = get_webdav_service()
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+
+def _require_session(data):
+    """Validate the session_id in an event payload and resolve the session.
+
+    Emits webdav_error and returns None when the payload has no session_id
+    or the session doesn't exist, so each handler does exactly one service
+    lookup per event instead of repeating the validation boilerplate.
+
+    Args:
+        data (dict): The event payload
+
+    Returns:
+        TerminalSession or None
+    """
+    session_id = data.get('session_id')
+
+    if not session_id:
+        emit('webdav_error', {'message': 'Session ID is required'})
+        return None
+
+    session = terminal_service.get_session(session_id)
+    if not session:
+        emit('webdav_error', {'message': f'Session not found: {session_id}'})
+        return None
+
+    return session
+
+
 def register_webdav_socket_events(socketio):
     """Register WebDAV testing WebSocket events."""
     
@@ -27,18 +58,11 @@ def register_webdav_socket_events(socketio):
     @socketio.on('webdav_get_credentials')
     def handle_get_credentials(data):
         """Get or create WebDAV credentials for a session."""
-        session_id = data.get('session_id')
-        
-        if not session_id:
-            emit('webdav_error', {'message': 'Session ID is required'})
-            return
-        
-        # Check if session exists
-        session = terminal_service.get_session(session_id)
+        session = _require_session(data)
         if not session:
-            emit('webdav_error', {'message': f'Session not found: {session_id}'})
             return
-        
+        session_id = session.id
+
         # Get or create credentials
         credentials = webdav_service.add_session(session_id)
         
@@ -63,52 +87,50 @@ def register_webdav_socket_events(socketio):
     @socketio.on('webdav_test_connection')
     def handle_test_connection(data):
         """Test WebDAV connection by checking credentials and access."""
-        session_id = data.get('session_id')
-        
-        if not session_id:
-            emit('webdav_error', {'message': 'Session ID is required'})
+        session = _require_session(data)
+        if not session:
             return
-        
-        # Check if credentials exist for this session
-        has_credentials = session_id in webdav_service.credentials
-        
-        if not has_credentials:
+
+        # Check if credentials exist for this session; has() reads a
+        # frozenset snapshot, so this never contends with add/remove
+        if not webdav_service.has(session.id):
             emit('webdav_error', {'message': 'WebDAV not enabled for this session'})
             return
-        
-        # Check if session exists
-        session = terminal_service.get_session(session_id)
-        if not session:
-            emit('webdav_error', {'message': f'Session not found: {session_id}'})
-            return
-        
+
+        # Bind the path once; the handlers below touch it repeatedly
+        user_files = session.user_files
+
         # Test that files directory exists
-        if not os.path.exists(session.user_files):
+        if not os.path.exists(user_files):
             emit('webdav_test_result', {
                 'status': 'error',
                 'message': 'Files directory does not exist',
-                'user_files_path': session.user_files
+                'user_files_path': user_files
             })
             return
-        
+
+        # Count entries without materializing a list of names the way
+        # os.listdir does; scandir keeps this O(1) in memory
+        with os.scandir(user_files) as it:
+            files_count = sum(1 for _ in it)
+
         # Return success with path information
         emit('webdav_test_result', {
             'status': 'success',
             'message': 'WebDAV connection is ready',
-            'user_files_path': session.user_files,
-            'files_count': len(os.listdir(session.user_files))
+            'user_files_path': user_files,
+            'files_count': files_count
         })
     
     @socketio.on('webdav_list_files')
     def handle_list_files(data):
         """List files in the WebDAV directory."""
-        session_id = data.get('session_id')
-        path = data.get('path', '')
-        
-        if not session_id:
-            emit('webdav_error', {'message': 'Session ID is required'})
+        session = _require_session(data)
+        if not session:
             return
-        
+        session_id = session.id
+        path = data.get('path', '')
+
         try:
             files = terminal_service.get_session_files(session_id, path)
             emit('webdav_files_list', {
@@ -122,30 +144,35 @@ def register_webdav_socket_events(socketio):
     @socketio.on('execute_command')
     def handle_execute_command(data):
         """Execute a shell command and stream output."""
-        session_id = data.get('session_id')
         command = data.get('command')
-        
-        if not session_id or not command:
+        use_shell = bool(data.get('shell', False))
+
+        if not data.get('session_id') or not command:
             emit('webdav_error', {'message': 'Session ID and command are required'})
             return
-        
-        # Check if session exists
-        session = terminal_service.get_session(session_id)
+
+        session = _require_session(data)
         if not session:
-            emit('webdav_error', {'message': f'Session not found: {session_id}'})
             return
-        
-        # Create a unique room for this command
-        command_id = f"{session_id}_{int(time.time())}"
-        join_room(command_id)
-        
-        # Start command in a separate thread
-        thread = threading.Thread(
-            target=_execute_command_thread, 
-            args=(command_id, session, command)
+        session_id = session.id
+
+        # Mint a command ID; a random suffix avoids a clock read and can't
+        # collide the way second-resolution timestamps do for back-to-back
+        # commands
+        command_id = f"{session_id}_{uuid.uuid4().hex[:8]}"
+
+        # The only subscriber is the requesting client, so emit straight to
+        # its sid rather than paying for a single-member room's bookkeeping
+        # and fanout on every output chunk
+        sid = request.sid
+
+        # Run the command as a Socket.IO background task so emits go through
+        # the configured async mode instead of a bare OS thread that relies
+        # on request context it doesn't have
+        socketio.start_background_task(
+            _execute_command_thread, socketio, command_id, sid, session,
+            command, use_shell
         )
-        thread.daemon = True
-        thread.start()
         
         emit('command_started', {
             'command_id': command_id,
@@ -156,77 +183,115 @@ def register_webdav_socket_events(socketio):
     @socketio.on('webdav_create_test_file')
     def handle_create_test_file(data):
         """Create a test file in the WebDAV directory."""
-        session_id = data.get('session_id')
-        filename = data.get('filename', f'test_file_{int(time.time())}.txt')
-        content = data.get('content', 'This is a test file created via WebSocket.')
-        
-        if not session_id:
-            emit('webdav_error', {'message': 'Session ID is required'})
-            return
-        
-        # Check if session exists
-        session = terminal_service.get_session(session_id)
+        session = _require_session(data)
         if not session:
-            emit('webdav_error', {'message': f'Session not found: {session_id}'})
             return
-        
+        session_id = session.id
+        filename = data.get('filename', f'test_file_{uuid.uuid4().hex[:8]}.txt')
+        content = data.get('content', 'This is a test file created via WebSocket.')
+
+        # Bind the session paths once before the checks below
+        user_files = session.user_files
+        user_files_abs = session.user_files_abs
+
         try:
-            # Create file in the user files directory
-            file_path = os.path.join(session.user_files, filename)
-            
-            # Make sure the file path is within the user files directory
-            if not os.path.abspath(file_path).startswith(os.path.abspath(session.user_files)):
+            # Create file in the user files directory; resolve once and
+            # compare against the abspath cached on the session, using
+            # commonpath so sibling directories sharing a prefix don't pass
+            target = os.path.abspath(os.path.join(user_files, filename))
+            if os.path.commonpath([target, user_files_abs]) != user_files_abs:
                 emit('webdav_error', {'message': 'Invalid file path'})
                 return
             
-            with open(file_path, 'w') as f:
+            with open(target, 'w') as f:
                 f.write(content)
             
             emit('webdav_file_created', {
                 'session_id': session_id,
                 'filename': filename,
-                'path': file_path,
+                'path': target,
                 'size': len(content)
             })
         except Exception as e:
             emit('webdav_error', {'message': f'Error creating file: {str(e)}'})
 
-def _execute_command_thread(command_id, session, command):
-    """Execute a command in a separate thread and stream output."""
+def _execute_command_thread(socketio, command_id, sid, session, command, use_shell=False):
+    """Execute a command as a background task and stream batched output."""
     try:
         # Change to the user's files directory
         cwd = session.user_files
         
-        # Create the process
+        # Split into argv and skip the /bin/sh fork unless the client
+        # explicitly opts into shell features; this also closes the
+        # command-injection foot-gun of defaulting to shell=True
+        args = command if use_shell else shlex.split(command)
+        
+        # Create the process; unbuffered since we read the fd directly
         process = subprocess.Popen(
-            command,
-            shell=True,
+            args,
+            shell=use_shell,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             cwd=cwd,
-            text=True,
-            bufsize=1
+            bufsize=0
         )
         
-        # Read output and emit events
-        for line in iter(process.stdout.readline, ''):
-            emit('command_output', {
+        # Enlarge the stdout pipe so the child blocks less often on bulk
+        # output and the reader drains bigger chunks per wakeup; platforms
+        # without F_SETPIPE_SZ keep the default 64KB. Popen already opens
+        # its pipes close-on-exec.
+        stdout_fd = process.stdout.fileno()
+        if hasattr(fcntl, 'F_SETPIPE_SZ'):
+            try:
+                fcntl.fcntl(stdout_fd, fcntl.F_SETPIPE_SZ, 1 << 20)
+            except OSError:
+                pass
+
+        # Read large binary chunks and flush every 16KB or 20ms, instead of
+        # emitting one WebSocket frame per output line. Read through the
+        # Popen file object, not os.read on the raw fd: under the gevent
+        # monkey-patch stdout is a cooperative FileObject that yields to
+        # the hub while the pipe is empty, whereas a raw os.read would
+        # either raise BlockingIOError (gevent sets the fd non-blocking)
+        # or block the whole single-threaded worker. With bufsize=0 the
+        # unpatched file object has the same return-what's-available
+        # semantics as os.read.
+        stdout = process.stdout
+        pending = bytearray()
+        deadline = time.monotonic() + 0.02
+        while True:
+            chunk = stdout.read(65536)
+            if not chunk:
+                break
+            pending += chunk
+            if len(pending) >= 16384 or time.monotonic() >= deadline:
+                socketio.emit('command_output', {
+                    'command_id': command_id,
+                    'output': pending.decode('utf-8', errors='replace')
+                }, to=sid)
+                pending.clear()
+                deadline = time.monotonic() + 0.02
+                # Yield so other greenlets run between flushes
+                socketio.sleep(0)
+        
+        if pending:
+            socketio.emit('command_output', {
                 'command_id': command_id,
-                'output': line
-            }, room=command_id)
+                'output': pending.decode('utf-8', errors='replace')
+            }, to=sid)
         
         # Wait for process to complete
         exit_code = process.wait()
         
         # Send completion event
-        emit('command_completed', {
+        socketio.emit('command_completed', {
             'command_id': command_id,
             'exit_code': exit_code
-        }, room=command_id)
+        }, to=sid)
         
     except Exception as e:
         logger.error(f"Error executing command: {str(e)}")
-        emit('command_error', {
+        socketio.emit('command_error', {
             'command_id': command_id,
             'error': str(e)
-        }, room=command_id)
+        }, to=sid)
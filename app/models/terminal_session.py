@@ -1,31 +1,380 @@
 import os
+import sys
 import time
 import uuid
+import fcntl
 import ptyprocess
 import threading
 import pyte
+import selectors
+import codecs
 import subprocess
 import shutil
-from collections import deque
+from queue import SimpleQueue
 import json
 
+class PTYReactor:
+    """
+    Multiplexes PTY output for every session onto one reader thread.
+    
+    Each session used to run its own OS thread blocked in pty.read; with
+    many sessions that means N kernel threads and N GIL-contending readers.
+    The reactor registers every session's PTY fd with a
+    selectors.DefaultSelector (epoll on Linux) and dispatches reads from a
+    single background thread.
+    """
+    
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        # Registration changes are queued and applied on the reactor thread,
+        # since the selectors module is not safe to mutate concurrently
+        # with select()
+        self._pending = SimpleQueue()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def register(self, fd, session):
+        """Start dispatching reads from fd to the given session."""
+        self._pending.put(('register', fd, session))
+        self._wake()
+    
+    def unregister(self, fd):
+        """Stop dispatching reads from fd."""
+        self._pending.put(('unregister', fd, None))
+        self._wake()
+    
+    def _wake(self):
+        os.write(self._wakeup_w, b'\0')
+    
+    def _apply_pending(self):
+        while not self._pending.empty():
+            op, fd, session = self._pending.get()
+            try:
+                if op == 'register':
+                    self._selector.register(fd, selectors.EVENT_READ, session)
+                else:
+                    self._selector.unregister(fd)
+            except (KeyError, ValueError, OSError):
+                # fd already gone or registered; nothing to do
+                pass
+    
+    def _run(self):
+        while True:
+            self._apply_pending()
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.data is None:
+                    # Drain the wakeup pipe
+                    os.read(self._wakeup_r, 4096)
+                    continue
+                session = key.data
+                try:
+                    data = os.read(key.fd, 262144)
+                except BlockingIOError:
+                    # Spurious readiness on a non-blocking fd; not EOF
+                    continue
+                except OSError:
+                    data = b''
+                if not data:
+                    self._pending.put(('unregister', key.fd, None))
+                    session._handle_pty_eof()
+                else:
+                    session._handle_pty_output(data)
+
+
+# One reactor shared by all sessions in the process
+_pty_reactor = PTYReactor()
+
+
+def _tune_output_fd(fd):
+    """Best-effort tuning of an output fd before it is read in a loop.
+
+    F_SETPIPE_SZ enlarges the kernel buffer to 1 MiB so bulk output moves in
+    fewer writer blocks and reader wakeups (ignored where the fd isn't a
+    pipe, e.g. a PTY master); FD_CLOEXEC keeps the fd out of spawned
+    children. The fd is deliberately left blocking: status flags are shared
+    between the read and write sides of the PTY master, so O_NONBLOCK here
+    would also make session.write fail with EAGAIN on large pastes
+    (ptyprocess writes without a partial-write retry). The reactor only
+    reads fds that select reported ready, so a blocking read side is safe.
+    """
+    if hasattr(fcntl, 'F_SETPIPE_SZ'):
+        try:
+            fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, 1 << 20)
+        except OSError:
+            pass
+    try:
+        flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+        fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+    except OSError:
+        pass
+
+# Shared read-only venv template that per-session venvs are cloned from via
+# hardlinks. Building pip/setuptools/wheel once here replaces two heavy
+# subprocess runs per session, and hardlinked site-packages dedupe the wheel
+# files across sessions on disk.
+VENV_TEMPLATE_DIR = os.path.join(
+    os.path.dirname(os.environ.get('STORAGE_DIR', './storage/users').rstrip('/')),
+    '_venv_template'
+)
+
+_venv_template_lock = threading.Lock()
+
+# The interpreter path never changes for the life of the process
+PYTHON_EXECUTABLE = sys.executable
+
+# Offset mapping the monotonic clock onto the wall clock, taken once at
+# import. Activity timestamps are recorded with time.monotonic_ns — cheaper
+# than a wall-clock read and immune to clock steps going backward — and
+# converted to epoch seconds only when reported.
+_MONO_EPOCH_OFFSET = time.time() - time.monotonic()
+
+# Shared config-file template directory. Fully static dotfiles are written
+# here once and hardlinked into each session home, so per-session setup
+# writes only the files that actually vary per session.
+CONFIG_TEMPLATE_DIR = os.path.join(
+    os.path.dirname(os.environ.get('STORAGE_DIR', './storage/users').rstrip('/')),
+    '_config_template'
+)
+
+_config_template_lock = threading.Lock()
+_config_template_ready = False
+
+# Per-session file bodies, precompiled as %-format templates at import time
+# so session setup does a single substitute + encode instead of rebuilding
+# a multi-kilobyte f-string per session. The .bashrc carries only the
+# per-session exports; everything else lives in the shared .bashrc.common
+# it sources, which references these exports instead of literal paths.
+_BASHRC_TEMPLATE = '''
+# Terminal configuration for user session %(session_id)s
+export USER_SESSION_ID="%(session_id)s"
+export USER_FILES="%(user_files)s"
+export USER_HOME="%(user_home)s"
+export USER_VENV="%(user_venv)s"
+
+source ~/.bashrc.common
+'''
+
+_README_TEMPLATE = '''
+Welcome to your personal workspace!
+
+This is your isolated environment where you can:
+- Create and edit files
+- Install Python packages
+- Run scripts and applications
+
+Your session ID is: %(session_id)s
+
+All files and packages you create here are only accessible to you.
+'''
+
+# (filename, body, mode) for files identical across all sessions
+_STATIC_HOME_FILES = (
+    ('.bashrc.common', b'''
+# Shared terminal configuration, sourced by ~/.bashrc after it exports the
+# per-session USER_* variables
+export PS1="\\[\\033[01;32m\\]user@termux-web\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\033[00m\\]\\$ "
+
+# Environment variables
+export EDITOR=nano
+export VISUAL=nano
+export LANG=en_US.UTF-8
+export LC_ALL=en_US.UTF-8
+export HISTSIZE=5000
+export HISTFILESIZE=10000
+export HISTCONTROL=ignoreboth:erasedups
+export PYTHONUSERBASE="$USER_HOME"
+
+# Path configuration
+export PATH="$USER_HOME/bin:$USER_FILES:$USER_VENV/bin:$PATH"
+
+# Automatically activate the virtual environment
+source "$USER_VENV/bin/activate" 2>/dev/null || echo "Virtual environment not initialized yet."
+
+# Aliases
+alias ll="ls -la"
+alias py=python
+alias python=python3
+alias pip=pip3
+alias cls="clear"
+alias h="history"
+alias ..="cd .."
+alias ...="cd ../.."
+alias myfiles='cd "$USER_FILES"'
+alias myvenv='cd "$USER_VENV"'
+
+# Colors for ls command
+export LS_COLORS="di=1;34:ln=1;36:so=1;35:pi=1;33:ex=1;32:bd=1;33:cd=1;33:su=1;31:sg=1;31:tw=1;34:ow=1;34"
+alias ls="ls --color=auto"
+alias grep="grep --color=auto"
+
+# Welcome message
+echo "Welcome to your isolated Termux Web Terminal! (Session ID: $USER_SESSION_ID)"
+echo "\xe2\x80\xa2 Your files are stored in: $USER_FILES"
+echo "\xe2\x80\xa2 Edit files:  nano filename.py, vim filename.py"
+echo "\xe2\x80\xa2 Run scripts: python filename.py"
+echo "\xe2\x80\xa2 Install packages: pip install packagename"
+echo "\xe2\x80\xa2 Your packages are isolated to this session only"
+echo ""
+''', 0o644),
+    ('.bash_profile', b'''
+# Source bashrc
+if [ -f ~/.bashrc ]; then
+    source ~/.bashrc
+fi
+''', 0o755),
+    ('.vimrc', b'''
+syntax on
+set autoindent
+set expandtab
+set number
+set tabstop=4
+set shiftwidth=4
+set softtabstop=4
+set background=dark
+colorscheme default
+set ruler
+set showcmd
+set incsearch
+set hlsearch
+set showmatch
+filetype plugin indent on
+''', 0o644),
+    ('.tmux.conf', b'''
+set -g default-terminal "screen-256color"
+set -g history-limit 10000
+set -g base-index 1
+setw -g pane-base-index 1
+set -g status-bg black
+set -g status-fg white
+''', 0o644),
+    ('.inputrc', b'''
+set completion-ignore-case on
+set show-all-if-ambiguous on
+set mark-symlinked-directories on
+"\\e[A": history-search-backward
+"\\e[B": history-search-forward
+''', 0o644),
+)
+
+_STATIC_USER_FILES = (
+    ('example.py', b'''
+#!/usr/bin/env python3
+"""
+Example Python script
+"""
+
+def hello(name="World"):
+    """Say hello to the specified name."""
+    return f"Hello, {name}!"
+
+if __name__ == "__main__":
+    print(hello())
+
+    # You can also get input from the user
+    name = input("Enter your name: ")
+    print(hello(name))
+
+    print("\\nTry installing packages with:")
+    print("pip install requests")
+''', 0o755),
+)
+
+
+def _write_file(path, body, mode):
+    """Write body (bytes) to path in one open/write/close with the given mode."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        os.write(fd, body)
+        # O_CREAT mode is filtered by the umask; enforce the exact mode
+        os.chmod(path, mode)
+    finally:
+        os.close(fd)
+
+
+def _ensure_config_templates():
+    """Write the static dotfile bodies into the shared template dir once."""
+    global _config_template_ready
+    if _config_template_ready:
+        return
+    with _config_template_lock:
+        if _config_template_ready:
+            return
+        os.makedirs(CONFIG_TEMPLATE_DIR, exist_ok=True)
+        for name, body, mode in _STATIC_HOME_FILES + _STATIC_USER_FILES:
+            path = os.path.join(CONFIG_TEMPLATE_DIR, name)
+            if not os.path.exists(path):
+                _write_file(path, body, mode)
+        _config_template_ready = True
+
+
+def _copy_template_file(src, dst):
+    """Copy src into a session directory unless dst already exists.
+
+    A copy, never a hardlink: every session runs as the same uid, so a
+    linked dotfile would be one writable inode shared by all session homes
+    and the template itself - an in-place edit from any session would show
+    up everywhere, and .bash_profile/.bashrc.common are executed by other
+    sessions' shells. copy2 still goes through the kernel fast path
+    (sendfile/copy_file_range) for the data."""
+    if not os.path.exists(dst):
+        shutil.copy2(src, dst)
+
+
+def _ensure_venv_template():
+    """
+    Build the shared template venv if it doesn't exist yet.
+
+    Returns:
+        bool: True when the template is usable, False if building it failed
+    """
+    marker = os.path.join(VENV_TEMPLATE_DIR, 'bin', 'pip')
+    if os.path.exists(marker):
+        return True
+    with _venv_template_lock:
+        if os.path.exists(marker):
+            return True
+        try:
+            subprocess.run(
+                [PYTHON_EXECUTABLE, '-m', 'venv', VENV_TEMPLATE_DIR],
+                check=True,
+                capture_output=True
+            )
+            subprocess.run(
+                [os.path.join(VENV_TEMPLATE_DIR, 'bin', 'pip'),
+                 'install', '--upgrade', 'pip', 'setuptools', 'wheel'],
+                check=True,
+                capture_output=True
+            )
+            return True
+        except Exception as e:
+            print(f"Error creating venv template: {str(e)}")
+            return False
+
 class TerminalSession:
     """
     Represents a terminal session with a PTY process and terminal emulator.
     This class manages the process lifecycle and maintains the terminal state.
     """
     
-    def __init__(self, shell, cwd, env, cols=80, rows=24, buffer_size=10000):
+    def __init__(self, shell, cwd, env, cols=80, rows=24, buffer_size=256 * 1024,
+                 passthrough=True):
         """
         Initialize a new terminal session.
-        
+
         Args:
             shell (str): The shell program to run (e.g., /bin/bash)
             cwd (str): Current working directory to start the shell in
             env (dict): Environment variables for the shell
             cols (int): Number of columns in the terminal
             rows (int): Number of rows in the terminal
-            buffer_size (int): Maximum size of output buffer in lines
+            buffer_size (int): Size of the raw output ring buffer in bytes
+            passthrough (bool): If True (the default), skip server-side
+                terminal emulation on the read path — clients like xterm.js
+                render escape sequences themselves, so feeding pyte per
+                chunk is pure overhead. Rendered views are then replayed
+                on demand from the ring buffer.
         """
         # Generate a unique session ID
         self.id = str(uuid.uuid4())
@@ -33,7 +382,16 @@ class TerminalSession:
         self.cols = cols
         self.rows = rows
         self.created_at = time.time()
-        self.last_activity = time.time()
+        self.last_activity_ns = time.monotonic_ns()
+
+        # Cached to_dict snapshot; see to_dict for the staleness contract
+        self._dict_cache = None
+        self._dict_cache_ts = 0.0
+
+        # Serializes lifecycle transitions (resize/terminate) against the
+        # reactor's EOF path so terminate runs exactly once and resize
+        # never races a concurrent teardown
+        self._lifecycle_lock = threading.RLock()
         self.buffer_size = buffer_size
         
         # Get storage directory from environment or use default
@@ -44,11 +402,25 @@ class TerminalSession:
         self.user_home = os.path.join(self.user_dir, 'home')
         self.user_files = os.path.join(self.user_dir, 'files')
         self.user_venv = os.path.join(self.user_dir, 'venv')
+
+        # Derived paths used by PATH construction, venv creation, and
+        # activation; joined once instead of re-formatted at each use
+        self.user_bin = os.path.join(self.user_home, 'bin')
+        self.venv_bin = os.path.join(self.user_venv, 'bin')
+        self.venv_activate = os.path.join(self.venv_bin, 'activate')
+
+        # Create these directories: one makedirs of the deepest home path
+        # covers every ancestor, and files then needs only a single mkdir
+        # since the shared parent already exists
+        os.makedirs(self.user_bin, exist_ok=True)
+        try:
+            os.mkdir(self.user_files)
+        except FileExistsError:
+            pass
         
-        # Create these directories
-        os.makedirs(self.user_home, exist_ok=True)
-        os.makedirs(self.user_files, exist_ok=True)
-        os.makedirs(f"{self.user_home}/bin", exist_ok=True)
+        # Resolved once so per-request path-containment checks don't redo
+        # the abspath walk
+        self.user_files_abs = os.path.abspath(self.user_files)
         
         # Use user-specific files directory if cwd is not specified
         if not cwd or cwd == "/":
@@ -59,8 +431,11 @@ class TerminalSession:
             if not os.path.exists(self.cwd):
                 os.makedirs(self.cwd, exist_ok=True)
         
-        # Configure environment properly for full terminal experience with user isolation
-        self.env = env.copy() if env else os.environ.copy()
+        # Configure environment properly for full terminal experience with
+        # user isolation. The caller hands over a freshly built dict (the
+        # API layer merges onto its import-time snapshot), so the session
+        # takes ownership instead of copying it again.
+        self.env = env if env else os.environ.copy()
         
         # Set HOME to the user's isolated home directory
         self.env['HOME'] = self.user_home
@@ -78,8 +453,7 @@ class TerminalSession:
         
         # Ensure proper PATH environment that includes user's own binaries and virtual environment
         base_path = '/usr/local/bin:/usr/bin:/bin'
-        session_paths = f"{self.user_home}/bin:{self.user_files}:{self.user_venv}/bin"
-        self.env['PATH'] = f"{session_paths}:{base_path}"
+        self.env['PATH'] = ':'.join((self.user_bin, self.user_files, self.venv_bin, base_path))
         
         # Set PYTHONUSERBASE to user's home directory for pip install --user
         self.env['PYTHONUSERBASE'] = self.user_home
@@ -87,13 +461,29 @@ class TerminalSession:
         # Set user ID in environment for scripts to identify user's session
         self.env['USER_SESSION_ID'] = self.id
             
-        # Create output buffer with deque for efficient append and trim operations
-        self.output_buffer = deque(maxlen=buffer_size)
+        # Raw output is kept in a preallocated ring buffer: appends copy into
+        # fixed memory with no per-chunk allocation or GC churn, and memory
+        # per session is bounded by buffer_size bytes rather than growing
+        # with a deque of string snapshots
+        self._ring = bytearray(buffer_size)
+        self._ring_head = 0  # next write offset
+        self._ring_len = 0   # valid bytes stored, <= buffer_size
+        
+        # Set up terminal emulator. In passthrough mode no live screen is
+        # kept; get_buffer(rendered=True) replays the ring into a transient
+        # screen when a snapshot is actually wanted.
+        self.passthrough = passthrough
+        if passthrough:
+            self.screen = None
+            self.stream = None
+        else:
+            self.screen = pyte.Screen(cols, rows)
+            self.stream = pyte.Stream()
+            self.stream.attach(self.screen)
         
-        # Set up terminal emulator
-        self.screen = pyte.Screen(cols, rows)
-        self.stream = pyte.Stream()
-        self.stream.attach(self.screen)
+        # Incremental decoder so multi-byte UTF-8 sequences split across
+        # PTY reads don't turn into replacement characters
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
         
         # Create shell config files and other user files
         self._setup_user_environment()
@@ -104,271 +494,252 @@ class TerminalSession:
             cwd=self.cwd,
             env=self.env
         )
-        
+
+        # Pin the child pid at spawn; reading it through self.pty after a
+        # forced terminate races the teardown path
+        self.pid = self.pty.pid
+
         # Flag to indicate if the session is active
         self.active = True
         
-        # Set up reading thread
-        self.read_thread = threading.Thread(target=self._read_pty_output)
-        self.read_thread.daemon = True
-        self.read_thread.start()
+        # Output callbacks, kept as an immutable snapshot tuple rebuilt
+        # copy-on-write on (un)registration so the read path iterates it
+        # without locking; must exist before the reactor can dispatch
+        # output to this session. Each entry is (original, wrapped) where
+        # wrapped already swallows callback exceptions.
+        self._callbacks = ()
+        self._callbacks_lock = threading.Lock()
         
-        # List of callbacks to call when output is received
-        self.output_callbacks = []
+        # Register with the shared reactor instead of spawning a dedicated
+        # reader thread per session
+        self._pty_fd = self.pty.fd
+        _tune_output_fd(self._pty_fd)
+        _pty_reactor.register(self._pty_fd, self)
         
         # Activate the virtual environment automatically on session start
         self._activate_virtual_environment()
     
     def _create_virtual_environment(self):
-        """Create a Python virtual environment specific to this user session"""
+        """
+        Provision this session's Python virtual environment off the critical path.
+
+        The old implementation ran `python -m venv` plus a pip upgrade
+        synchronously in __init__, adding seconds of tail latency to every
+        session creation. Now the venv is hardlink-cloned from a shared
+        template on a background thread; set CREATE_VENV=0 to skip venvs
+        entirely for deployments that don't need Python.
+        """
+        # Signalled once the venv exists (or creation was skipped/failed)
+        self._venv_ready = threading.Event()
+
+        if os.environ.get('CREATE_VENV', '1') != '1':
+            # Still signal: activation waits on this event and checks for
+            # the activate script itself, so it must never hang here
+            self._venv_ready.set()
+            return
+
+        if os.path.exists(self.user_venv):
+            self._venv_ready.set()
+            return
+
+        threading.Thread(target=self._build_virtual_environment, daemon=True).start()
+
+    def _build_virtual_environment(self):
+        """Build the session venv from the template, falling back to a full venv."""
         try:
-            if not os.path.exists(self.user_venv):
-                # Create virtual environment
-                subprocess.run(
-                    [sys.executable, '-m', 'venv', self.user_venv], 
-                    check=True,
-                    capture_output=True
-                )
-                
-                # Upgrade pip in the virtual environment
-                subprocess.run(
-                    [f"{self.user_venv}/bin/pip", "install", "--upgrade", "pip", "setuptools", "wheel"],
-                    check=True,
-                    capture_output=True
-                )
+            if _ensure_venv_template():
+                self._clone_venv_template()
+            else:
+                self._create_venv_from_scratch()
+        except OSError:
+            # Hardlinks can fail across filesystems; fall back to a real venv
+            shutil.rmtree(self.user_venv, ignore_errors=True)
+            try:
+                self._create_venv_from_scratch()
+            except Exception as e:
+                print(f"Error creating virtual environment: {str(e)}")
         except Exception as e:
             print(f"Error creating virtual environment: {str(e)}")
+        finally:
+            self._venv_ready.set()
+
+    def _clone_venv_template(self):
+        """Clone the shared template venv into self.user_venv via hardlinks."""
+        def link(src, dst, *, follow_symlinks=True):
+            os.link(src, dst, follow_symlinks=False)
+
+        shutil.copytree(VENV_TEMPLATE_DIR, self.user_venv,
+                        symlinks=True, copy_function=link)
+
+        # The activate scripts and console-script shebangs embed the template
+        # path; rewrite them to point at this session's venv. The affected
+        # files are rewritten (breaking the hardlink) so the template itself
+        # is never modified.
+        template_abs = os.path.abspath(VENV_TEMPLATE_DIR).encode()
+        venv_abs = os.path.abspath(self.user_venv).encode()
+        with os.scandir(self.venv_bin) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                with open(entry.path, 'rb') as f:
+                    body = f.read()
+                if template_abs not in body:
+                    continue
+                mode = entry.stat(follow_symlinks=False).st_mode
+                os.unlink(entry.path)
+                with open(entry.path, 'wb') as f:
+                    f.write(body.replace(template_abs, venv_abs))
+                os.chmod(entry.path, mode)
+
+    def _create_venv_from_scratch(self):
+        """Create a standalone venv the slow way (no template available)."""
+        subprocess.run(
+            [PYTHON_EXECUTABLE, '-m', 'venv', self.user_venv],
+            check=True,
+            capture_output=True
+        )
+        subprocess.run(
+            [os.path.join(self.venv_bin, 'pip'),
+             "install", "--upgrade", "pip", "setuptools", "wheel"],
+            check=True,
+            capture_output=True
+        )
     
     def _activate_virtual_environment(self):
-        """Activate the virtual environment by sending commands to the terminal"""
-        # Add virtual environment activation to the startup
-        venv_activate_path = f"{self.user_venv}/bin/activate"
-        if os.path.exists(venv_activate_path):
+        """Activate the virtual environment by sending commands to the terminal.
+
+        The venv is built on a background thread, so for a fresh session it
+        usually doesn't exist yet when the shell starts; a small waiter
+        thread blocks on _venv_ready and sends the activation commands once
+        the build lands, instead of checking once and silently never
+        activating.
+        """
+        if self._venv_ready.is_set():
+            self._send_venv_activation()
+            return
+        threading.Thread(target=self._await_venv_activation, daemon=True).start()
+
+    def _await_venv_activation(self):
+        """Wait for the background venv build, then activate it in the shell."""
+        self._venv_ready.wait()
+        if not self.active:
+            return
+        try:
+            self._send_venv_activation()
+        except Exception as e:
+            # The shell may have exited between the check and the write
+            print(f"Error activating virtual environment: {str(e)}")
+
+    def _send_venv_activation(self):
+        """Send the activation commands if the venv actually exists."""
+        if os.path.exists(self.venv_activate):
             # Send command to source the activate script
-            self.write(f"source {venv_activate_path}\n")
+            self.write(f"source {self.venv_activate}\n")
             # Show python version to confirm
             self.write("python --version\n")
             # Show pip version
             self.write("pip --version\n")
     
     def _setup_user_environment(self):
-        """Set up the user's environment with configuration files"""
-        # Create a custom .bashrc with user-specific paths and config
-        bashrc_path = os.path.join(self.user_home, '.bashrc')
-        with open(bashrc_path, 'w') as f:
-            f.write(f'''
-# Terminal configuration for user session {self.id}
-export PS1="\\[\\033[01;32m\\]user@termux-web\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\033[00m\\]\\$ "
+        """Set up the user's environment with configuration files.
 
-# Environment variables
-export EDITOR=nano
-export VISUAL=nano
-export LANG=en_US.UTF-8
-export LC_ALL=en_US.UTF-8
-export HISTSIZE=5000
-export HISTFILESIZE=10000
-export HISTCONTROL=ignoreboth:erasedups
-
-# Session-specific paths
-export USER_SESSION_ID="{self.id}"
-export USER_FILES="{self.user_files}"
-export USER_HOME="{self.user_home}"
-export USER_VENV="{self.user_venv}"
-export PYTHONUSERBASE="{self.user_home}"
-
-# Path configuration
-export PATH="{self.user_home}/bin:{self.user_files}:{self.user_venv}/bin:$PATH"
+        Per-session files (.bashrc, README.txt) are rendered from templates
+        precompiled at import time and written with one syscall triple each;
+        fully static dotfiles are copied from the shared template directory
+        instead of re-rendered per session.
+        """
+        _ensure_config_templates()
 
-# Automatically activate the virtual environment
-source "{self.user_venv}/bin/activate" 2>/dev/null || echo "Virtual environment not initialized yet."
+        subst = {
+            'session_id': self.id,
+            'user_files': self.user_files,
+            'user_home': self.user_home,
+            'user_venv': self.user_venv,
+        }
 
-# Aliases
-alias ll="ls -la"
-alias py=python
-alias python=python3
-alias pip=pip3
-alias cls="clear"
-alias h="history"
-alias ..="cd .."
-alias ...="cd ../.."
-alias myfiles="cd {self.user_files}"
-alias myvenv="cd {self.user_venv}"
+        # Create a custom .bashrc with user-specific paths and config
+        bashrc_path = os.path.join(self.user_home, '.bashrc')
+        _write_file(bashrc_path, (_BASHRC_TEMPLATE % subst).encode('utf-8'), 0o755)
 
-# Colors for ls command
-export LS_COLORS="di=1;34:ln=1;36:so=1;35:pi=1;33:ex=1;32:bd=1;33:cd=1;33:su=1;31:sg=1;31:tw=1;34:ow=1;34"
-alias ls="ls --color=auto"
-alias grep="grep --color=auto"
+        # Copy the static dotfiles into the session home
+        for name, _body, _mode in _STATIC_HOME_FILES:
+            _copy_template_file(os.path.join(CONFIG_TEMPLATE_DIR, name),
+                                os.path.join(self.user_home, name))
 
-# Welcome message
-echo "Welcome to your isolated Termux Web Terminal! (Session ID: {self.id})"
-echo "• Your files are stored in: {self.user_files}"
-echo "• Edit files:  nano filename.py, vim filename.py"
-echo "• Run scripts: python filename.py"
-echo "• Install packages: pip install packagename"
-echo "• Your packages are isolated to this session only"
-echo ""
-''')
-        os.chmod(bashrc_path, 0o755)
-        
-        # Create .bash_profile to source .bashrc
-        bash_profile_path = os.path.join(self.user_home, '.bash_profile')
-        with open(bash_profile_path, 'w') as f:
-            f.write('''
-# Source bashrc
-if [ -f ~/.bashrc ]; then
-    source ~/.bashrc
-fi
-''')
-        os.chmod(bash_profile_path, 0o755)
-        
         # Create empty .bash_history
-        history_path = os.path.join(self.user_home, '.bash_history')
-        open(history_path, 'w').close()
-        os.chmod(history_path, 0o644)
-            
-        # Add .vimrc with basic configuration
-        vimrc_path = os.path.join(self.user_home, '.vimrc')
-        with open(vimrc_path, 'w') as f:
-            f.write('''
-syntax on
-set autoindent
-set expandtab
-set number
-set tabstop=4
-set shiftwidth=4
-set softtabstop=4
-set background=dark
-colorscheme default
-set ruler
-set showcmd
-set incsearch
-set hlsearch
-set showmatch
-filetype plugin indent on
-''')
-        
-        # Create .tmux.conf
-        tmux_conf_path = os.path.join(self.user_home, '.tmux.conf')
-        with open(tmux_conf_path, 'w') as f:
-            f.write('''
-set -g default-terminal "screen-256color"
-set -g history-limit 10000
-set -g base-index 1
-setw -g pane-base-index 1
-set -g status-bg black
-set -g status-fg white
-''')
-        
-        # Create .inputrc
-        inputrc_path = os.path.join(self.user_home, '.inputrc')
-        with open(inputrc_path, 'w') as f:
-            f.write('''
-set completion-ignore-case on
-set show-all-if-ambiguous on
-set mark-symlinked-directories on
-"\e[A": history-search-backward
-"\e[B": history-search-forward
-''')
-        
+        _write_file(os.path.join(self.user_home, '.bash_history'), b'', 0o644)
+
         # Create a basic README in the user's files directory
         readme_path = os.path.join(self.user_files, 'README.txt')
-        with open(readme_path, 'w') as f:
-            f.write(f'''
-Welcome to your personal workspace!
-
-This is your isolated environment where you can:
-- Create and edit files
-- Install Python packages
-- Run scripts and applications
-
-Your session ID is: {self.id}
-
-All files and packages you create here are only accessible to you.
-''')
-        
-        # Create an example Python file
-        example_path = os.path.join(self.user_files, 'example.py')
-        with open(example_path, 'w') as f:
-            f.write('''
-#!/usr/bin/env python3
-"""
-Example Python script
-"""
+        _write_file(readme_path, (_README_TEMPLATE % subst).encode('utf-8'), 0o644)
 
-def hello(name="World"):
-    """Say hello to the specified name."""
-    return f"Hello, {name}!"
-
-if __name__ == "__main__":
-    print(hello())
+        # Copy the example Python file into the user's files directory
+        for name, _body, _mode in _STATIC_USER_FILES:
+            _copy_template_file(os.path.join(CONFIG_TEMPLATE_DIR, name),
+                                os.path.join(self.user_files, name))
     
-    # You can also get input from the user
-    name = input("Enter your name: ")
-    print(hello(name))
-    
-    print("\\nTry installing packages with:")
-    print("pip install requests")
-''')
-        os.chmod(example_path, 0o755)
-    
-    def _read_pty_output(self):
+    def _handle_pty_output(self, data):
         """
-        Read output from the PTY and process it through the terminal emulator.
-        This runs in a separate thread.
+        Process a batch of PTY output dispatched by the shared reactor.
+        
+        Args:
+            data (bytes): Raw bytes read from the PTY
         """
-        try:
-            while self.active:
-                try:
-                    # Read up to 1024 bytes from the PTY
-                    data = self.pty.read(1024)
-                    if not data:
-                        break
-                    
-                    # Update last activity timestamp
-                    self.last_activity = time.time()
-                    
-                    # Feed data to the terminal emulator
-                    self.stream.feed(data.decode('utf-8', errors='replace'))
-                    
-                    # Store the current display in the buffer
-                    self.update_buffer()
-                    
-                    # Call output callbacks
-                    for callback in self.output_callbacks:
-                        try:
-                            callback(self.id, data.decode('utf-8', errors='replace'))
-                        except Exception as e:
-                            print(f"Error in output callback: {e}")
-                            
-                except (EOFError, OSError):
-                    break
-        finally:
-            if self.active:
-                self.terminate()
-    
-    def update_buffer(self):
-        """Update the output buffer with the current screen state"""
-        # Get the display from the screen
-        display = []
-        for line in range(self.rows):
-            line_data = self.screen.display[line]
-            display.append(line_data)
+        if not self.active:
+            return
+        
+        # Update last activity timestamp once per batch
+        self.last_activity_ns = time.monotonic_ns()
         
-        # Add to the buffer
-        self.output_buffer.append('\n'.join(display))
+        # Decode exactly once per batch
+        text = self._decoder.decode(data)
+
+        # Feed the terminal emulator only when one is kept live; in
+        # passthrough mode the client renders escape sequences itself
+        if self.stream is not None:
+            self.stream.feed(text)
+        
+        # Store the raw batch in the ring; rendering the screen happens on
+        # demand in get_buffer, not once per read
+        self._ring_append(data)
+        
+        # Dispatch to callbacks; the snapshot is bound once and the common
+        # no-subscribers case returns without touching the loop. Error
+        # handling was baked into the wrappers at registration, so there is
+        # no per-call try/except here.
+        callbacks = self._callbacks
+        if callbacks:
+            session_id = self.id
+            for _orig, callback in callbacks:
+                callback(session_id, text)
+    
+    @property
+    def last_activity(self):
+        """Last activity time as epoch seconds, derived from the monotonic
+        timestamp so existing wall-clock consumers keep working."""
+        return _MONO_EPOCH_OFFSET + self.last_activity_ns / 1e9
+
+    def _handle_pty_eof(self):
+        """Handle PTY EOF reported by the reactor (shell exited)."""
+        if self.active:
+            self.terminate()
     
     def write(self, data):
         """
         Write data to the PTY.
-        
+
         Args:
-            data (str): Data to write to the PTY
+            data (str or bytes): Data to write to the PTY. Bytes pass
+                through unchanged, so binary client frames (large pastes)
+                skip the per-write encode.
         """
         if not self.active:
             raise Exception("Session is no longer active")
-        
-        self.last_activity = time.time()
-        self.pty.write(data.encode('utf-8'))
+
+        self.last_activity_ns = time.monotonic_ns()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.pty.write(data)
     
     def resize(self, cols, rows):
         """
@@ -378,28 +749,36 @@ if __name__ == "__main__":
             cols (int): New number of columns
             rows (int): New number of rows
         """
-        if not self.active:
-            raise Exception("Session is no longer active")
-        
-        self.cols = cols
-        self.rows = rows
-        self.pty.setwinsize(rows, cols)
-        
-        # Resize the terminal emulator
-        self.screen.resize(lines=rows, columns=cols)
+        with self._lifecycle_lock:
+            if not self.active:
+                raise Exception("Session is no longer active")
+
+            self.cols = cols
+            self.rows = rows
+            self.pty.setwinsize(rows, cols)
+
+            # Resize the terminal emulator, if one is kept live
+            if self.screen is not None:
+                self.screen.resize(lines=rows, columns=cols)
+
+            # New geometry must show up in the next to_dict
+            self._dict_cache_ts = 0.0
     
     def terminate(self):
         """Terminate the session and clean up resources."""
-        if self.active:
+        with self._lifecycle_lock:
+            if not self.active:
+                return
             self.active = False
+            _pty_reactor.unregister(self._pty_fd)
+            # Drain the incremental decoder; a multi-byte sequence cut off
+            # by the shell exiting becomes its replacement char here instead
+            # of lingering as decoder state
+            self._decoder.decode(b'', final=True)
             try:
                 self.pty.terminate(force=True)
             except:
                 pass
-            
-            # Wait for the read thread to exit
-            if self.read_thread.is_alive():
-                self.read_thread.join(timeout=1.0)
     
     def cleanup(self, remove_files=False):
         """
@@ -419,47 +798,170 @@ if __name__ == "__main__":
     def register_output_callback(self, callback):
         """
         Register a callback to be called when output is received.
-        
+
         Args:
-            callback (callable): A function that will be called with 
+            callback (callable): A function that will be called with
                                 (session_id, output_data) as arguments
         """
-        self.output_callbacks.append(callback)
-    
+        def safe_callback(session_id, data, _cb=callback):
+            try:
+                _cb(session_id, data)
+            except Exception as e:
+                print(f"Error in output callback: {e}")
+
+        with self._callbacks_lock:
+            self._callbacks = self._callbacks + ((callback, safe_callback),)
+
     def unregister_output_callback(self, callback):
         """
         Unregister a previously registered output callback.
-        
+
         Args:
             callback (callable): The callback to unregister
         """
-        if callback in self.output_callbacks:
-            self.output_callbacks.remove(callback)
+        with self._callbacks_lock:
+            self._callbacks = tuple(
+                entry for entry in self._callbacks if entry[0] is not callback
+            )
     
-    def get_buffer(self, max_lines=None):
+    def _ring_append(self, data):
+        """Copy a chunk of raw output into the ring buffer with wrap-around."""
+        n = len(data)
+        size = self.buffer_size
+        if n >= size:
+            # The chunk alone fills the ring; keep only its tail
+            self._ring[:] = data[-size:]
+            self._ring_head = 0
+            self._ring_len = size
+            return
+        head = self._ring_head
+        end = head + n
+        view = memoryview(data)
+        if end <= size:
+            self._ring[head:end] = view
+        else:
+            split = size - head
+            self._ring[head:] = view[:split]
+            self._ring[:n - split] = view[split:]
+        self._ring_head = end % size
+        self._ring_len = min(size, self._ring_len + n)
+
+    def get_tail_bytes(self, max_bytes=None):
+        """
+        Get the most recent raw output bytes.
+
+        Args:
+            max_bytes (int, optional): Maximum number of bytes to return
+                                      (from the end of the buffer)
+
+        Returns:
+            bytes: The tail of the raw output stream
+        """
+        if self._ring_len < self.buffer_size:
+            buf = bytes(self._ring[:self._ring_len])
+        else:
+            head = self._ring_head
+            buf = bytes(self._ring[head:]) + bytes(self._ring[:head])
+        if max_bytes is not None and max_bytes < len(buf):
+            return buf[-max_bytes:]
+        return buf
+
+    def _replay_screen(self):
+        """Feed the ring-buffer tail into a transient pyte screen.
+
+        Used in passthrough mode, where no live emulator runs on the read
+        path; the cost of a full replay is paid only when a rendered
+        snapshot is actually requested.
+        """
+        screen = pyte.Screen(self.cols, self.rows)
+        stream = pyte.Stream()
+        stream.attach(screen)
+        stream.feed(self.get_tail_bytes().decode('utf-8', errors='replace'))
+        return screen
+
+    def get_screen_diff(self):
+        """
+        Get the screen lines changed since the last call.
+
+        pyte records the indices of lines touched by fed output in
+        screen.dirty; returning just those lines lets callers ship per-line
+        patches instead of the whole rows x cols display, which under normal
+        terminal use redraws only a small fraction of the screen. In
+        passthrough mode there is no live screen to track dirt, so the full
+        replayed display is returned instead.
+
+        Returns:
+            dict: Mapping of line index to that line's rendered text
+        """
+        if self.screen is None:
+            display = self._replay_screen().display
+            return dict(enumerate(display))
+        dirty = self.screen.dirty
+        if not dirty:
+            return {}
+        lines = dirty.copy()
+        dirty.clear()
+        display = self.screen.display
+        return {line: display[line] for line in lines if line < len(display)}
+
+    def get_buffer(self, max_lines=None, rendered=False):
         """
         Get the terminal output buffer.
-        
+
         Args:
             max_lines (int, optional): Maximum number of lines to return
                                       (from the end of the buffer)
-        
+            rendered (bool): If True, return the current screen lines from
+                            the terminal emulator instead of raw output
+
         Returns:
-            list: List of buffer lines
+            list: Lines of raw output, or screen lines when rendered
         """
-        buffer_list = list(self.output_buffer)
-        if max_lines is not None and max_lines < len(buffer_list):
-            return buffer_list[-max_lines:]
-        return buffer_list
+        if rendered:
+            # Materialize the emulator screen only when a caller actually
+            # asks for it; building it per PTY read cost O(rows*cols) of
+            # string work on every kilobyte of output. Passthrough sessions
+            # replay the ring tail into a transient screen here.
+            screen = self._replay_screen() if self.screen is None else self.screen
+            return list(screen.display)
+
+        if max_lines is not None:
+            # Decode only a tail slice sized to the requested line count
+            # instead of the whole ring; fall back to the full buffer when
+            # lines turn out longer than the 256-byte estimate
+            tail = self.get_tail_bytes(max_bytes=max_lines * 256)
+            lines = tail.decode('utf-8', errors='replace').splitlines()
+            if len(tail) < self._ring_len:
+                if len(lines) > max_lines:
+                    # The slice starts mid-line; drop the partial first line
+                    return lines[-max_lines:]
+                tail = self.get_tail_bytes()
+                lines = tail.decode('utf-8', errors='replace').splitlines()
+            if max_lines < len(lines):
+                return lines[-max_lines:]
+            return lines
+
+        return self.get_tail_bytes().decode('utf-8', errors='replace').splitlines()
     
     def to_dict(self):
         """
         Convert session to a dictionary representation.
-        
+
+        The result is cached for up to a second: dashboards polling the
+        session list rebuild N dicts per poll otherwise, and within that
+        window only last_activity drifts. Resize and terminate invalidate
+        the cache so structural changes are visible immediately.
+
         Returns:
             dict: Dictionary representation of the terminal session
         """
-        return {
+        now = time.time()
+        cached = self._dict_cache
+        if (cached is not None and now - self._dict_cache_ts < 1.0
+                and cached['active'] == self.active):
+            return cached
+
+        info = {
             'id': self.id,
             'shell': self.shell,
             'cwd': self.cwd,
@@ -471,8 +973,9 @@ if __name__ == "__main__":
             'user_dir': self.user_dir,
             'user_files': self.user_files,
             'user_venv': self.user_venv,
-            'pid': self.pty.pid if self.active else None
+            'pid': self.pid if self.active else None
         }
+        self._dict_cache = info
+        self._dict_cache_ts = now
+        return info
 
-# Make sure we import sys
-import sys
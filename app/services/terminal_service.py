@@ -1,8 +1,12 @@
+import functools
+import heapq
 import threading
 import time
 import os
+import queue
 import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from app.models.terminal_session import TerminalSession
 from flask_socketio import emit
 
@@ -32,6 +36,39 @@ class TerminalService:
         self.sessions = {}
         self.session_lock = threading.Lock()
         self.inactive_timeout = inactive_timeout
+
+        # Callbacks invoked with the session ID after a session is
+        # terminated, so other services (e.g. WebDAV's provider cache) can
+        # drop per-session state immediately instead of scanning for it
+        self._terminate_callbacks = []
+
+        # Output funnel: the PTY reader hands chunks to this queue and a
+        # single Socket.IO background task drains, coalesces and emits them.
+        # queue.Queue (not SimpleQueue) on purpose — its locks come from the
+        # threading module, so under gevent monkey-patching a blocking get()
+        # yields to the hub instead of stalling the worker.
+        self._out_queue = queue.Queue()
+        self._socketio = None
+
+        # Expiry schedule: a heap of (deadline, session_id) consulted by
+        # the cleanup thread, which sleeps until the earliest deadline
+        # instead of scanning every session once a minute. Deadlines are
+        # validated lazily against the session's real last_activity on pop,
+        # so activity never has to reschedule anything.
+        self._deadlines = []
+        self._deadlines_lock = threading.Lock()
+        self._cleanup_wake = threading.Event()
+
+        # Directory removals run off the cleanup loop so one large tree
+        # doesn't stall expiry scheduling; directories are renamed to a
+        # *.deleting sentinel first, making the hand-off visible to (and
+        # skipped by) subsequent sweeps. The in-flight set keeps a sweep
+        # from resubmitting a sentinel whose removal is still running, so
+        # only genuinely abandoned ones (after a crash) are resumed.
+        self._gc_pool = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix='session-gc')
+        self._gc_inflight = set()
+        self._gc_inflight_lock = threading.Lock()
         
         # Get storage directory from environment or use default
         storage_dir = os.environ.get('STORAGE_DIR', './storage/users')
@@ -42,12 +79,12 @@ class TerminalService:
         logger.info(f"Using storage directory: {self.users_base_dir}")
         
         # Start background cleanup thread
-        self.cleanup_thread = threading.Thread(target=self._cleanup_inactive_sessions)
+        self.cleanup_thread = threading.Thread(target=self._cleanup_loop)
         self.cleanup_thread.daemon = True
         self.cleanup_thread.start()
         
         # Initial cleanup of any orphaned session directories
-        self._cleanup_orphaned_session_directories()
+        self.cleanup_orphaned_directories()
     
     def create_session(self, shell, cwd, env, cols=80, rows=24):
         """
@@ -72,7 +109,10 @@ class TerminalService:
             
             with self.session_lock:
                 self.sessions[session.id] = session
-            
+
+            # Put the session on the expiry schedule
+            self._schedule_expiry(session.id)
+
             logger.info(f"Created new terminal session: {session.id}")
             return session
         except Exception as e:
@@ -89,9 +129,20 @@ class TerminalService:
         Returns:
             TerminalSession or None: The terminal session if found, None otherwise
         """
-        with self.session_lock:
-            return self.sessions.get(session_id)
+        # Lock-free read: dict.get on a str key is atomic under the GIL,
+        # and lookups vastly outnumber the create/terminate mutations that
+        # still take session_lock for their read-modify-write
+        return self.sessions.get(session_id)
     
+    def register_terminate_callback(self, callback):
+        """
+        Register a callback to run after a session is terminated.
+
+        Args:
+            callback: Callable invoked with the terminated session's ID
+        """
+        self._terminate_callbacks.append(callback)
+
     def get_all_sessions(self):
         """
         Get all active terminal sessions.
@@ -99,8 +150,8 @@ class TerminalService:
         Returns:
             list: List of active terminal sessions
         """
-        with self.session_lock:
-            return list(self.sessions.values())
+        # list() over dict values is a single atomic snapshot; no lock
+        return list(self.sessions.values())
     
     def write_to_session(self, session_id, data):
         """
@@ -167,93 +218,340 @@ class TerminalService:
         with self.session_lock:
             if session_id in self.sessions:
                 del self.sessions[session_id]
-                
-        # Emit a terminated event to all clients subscribed to this session
-        emit('terminated', {
+
+        # Let interested services release their per-session state
+        for callback in self._terminate_callbacks:
+            try:
+                callback(session_id)
+            except Exception as e:
+                logger.error(f"Error in terminate callback: {str(e)}")
+
+        # Emit a terminated event to all clients subscribed to this session.
+        # Use the server-level emit when attached: the cleanup thread has no
+        # request context, which the module-level emit would require.
+        payload = {
             'session_id': session_id,
             'message': 'Session terminated'
-        }, room=session_id, namespace='/')
+        }
+        if self._socketio is not None:
+            self._emit('terminated', payload, room=session_id)
+        else:
+            emit('terminated', payload, room=session_id, namespace='/')
     
+    # Flush a coalescing window once it holds this much, regardless of time
+    OUTPUT_FLUSH_BYTES = 16384
+    # How long small chunks may wait for more data before being flushed
+    OUTPUT_FLUSH_INTERVAL = 0.01
+    # Chunks up to this size with nothing pending are echoed immediately;
+    # this is the interactive-typing path and must not see the window delay
+    OUTPUT_IMMEDIATE_MAX = 512
+    # Hard cap on one session's merged payload per flush. A runaway
+    # producer (yes(1) into a slow client) otherwise grows the pending
+    # buffer without bound while emits are stalled; beyond this the oldest
+    # output is dropped and a marker notes how much went missing.
+    OUTPUT_MAX_PENDING = 1024 * 1024
+
+    def attach_socketio(self, socketio):
+        """
+        Bind the SocketIO server and start the output emit loop.
+
+        Called once from the WebSocket registration path; until then
+        broadcasts fall back to the context-bound emit.
+
+        Args:
+            socketio: The flask_socketio.SocketIO instance
+        """
+        if self._socketio is not None:
+            return
+        self._socketio = socketio
+        # Bind the hot-path callables and a reusable JSON payload once;
+        # emit serializes before returning, so reusing the dict is safe
+        # from the single emit-loop task
+        self._emit = socketio.emit
+        self._get_participants = socketio.server.manager.get_participants
+        self._payload = {'session_id': None, 'data': None}
+        socketio.start_background_task(self._emit_loop)
+
     def _broadcast_output(self, session_id, output):
         """
-        Broadcast terminal output to WebSocket clients subscribed to the session.
-        
+        Queue terminal output for broadcast to the session's room.
+
         Args:
             session_id (str): The session ID
             output (str): Terminal output data
         """
-        # This will be called from the terminal session read thread
-        # We use Flask-SocketIO's emit function with a "room" parameter to broadcast 
-        # to only clients subscribed to this session
-        emit('output', {
-            'session_id': session_id,
-            'data': output
-        }, room=session_id, namespace='/')
-    
-    def _cleanup_inactive_sessions(self):
+        # Called from the PTY reader thread: hand off to the emit loop so
+        # the reader never touches the Socket.IO hub directly; emission and
+        # coalescing happen on a background task in the right context
+        if self._socketio is not None:
+            self._out_queue.put_nowait((session_id, output))
+        else:
+            self._emit_output(session_id, output)
+
+    def _emit_loop(self):
         """
-        Background thread to periodically clean up inactive sessions.
+        Drain queued output, coalescing rapid small chunks per session.
+
+        One frame per session per window instead of one per PTY read: a
+        lone small chunk (keystroke echo) is emitted at once, anything
+        larger waits up to OUTPUT_FLUSH_INTERVAL for more data or until
+        OUTPUT_FLUSH_BYTES accumulates.
         """
+        sio = self._socketio
+        out_queue = self._out_queue
         while True:
             try:
-                current_time = time.time()
-                sessions_to_terminate = []
-                
-                with self.session_lock:
-                    for session_id, session in self.sessions.items():
-                        # If session is inactive for more than the timeout, add to cleanup list
-                        if current_time - session.last_activity > self.inactive_timeout:
-                            sessions_to_terminate.append(session_id)
-                
-                # Terminate sessions outside the lock to avoid deadlocks
-                for session_id in sessions_to_terminate:
+                session_id, chunk = out_queue.get()
+                pending = {session_id: [chunk]}
+                total = len(chunk)
+
+                # Take whatever else is already queued
+                while True:
                     try:
-                        logger.info(f"Cleaning up inactive session: {session_id}")
-                        self.terminate_session(session_id, remove_files=True)
-                    except Exception as e:
-                        logger.error(f"Error terminating inactive session: {str(e)}")
-                
-                # Also check for orphaned session directories
-                self._cleanup_orphaned_session_directories()
-            
+                        session_id, chunk = out_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    pending.setdefault(session_id, []).append(chunk)
+                    total += len(chunk)
+
+                # Mid-size output: hold the window open briefly so a burst
+                # of reads becomes one frame. Tiny totals (interactive
+                # echo) and already-large ones skip the wait.
+                if self.OUTPUT_IMMEDIATE_MAX < total < self.OUTPUT_FLUSH_BYTES:
+                    sio.sleep(self.OUTPUT_FLUSH_INTERVAL)
+                    while total < self.OUTPUT_FLUSH_BYTES:
+                        try:
+                            session_id, chunk = out_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        pending.setdefault(session_id, []).append(chunk)
+                        total += len(chunk)
+
+                for session_id, chunks in pending.items():
+                    merged = chunks[0] if len(chunks) == 1 else ''.join(chunks)
+                    if len(merged) > self.OUTPUT_MAX_PENDING:
+                        dropped = len(merged) - self.OUTPUT_MAX_PENDING
+                        merged = ('\r\n[%d bytes of output dropped]\r\n' % dropped
+                                  + merged[-self.OUTPUT_MAX_PENDING:])
+                    self._emit_output(session_id, merged)
+                # Yield so client-facing greenlets run between batches
+                sio.sleep(0)
+            except Exception as e:
+                logger.error(f"Error in output emit loop: {str(e)}")
+
+    def _room_has_members(self, room):
+        """True if any client is in the given room."""
+        try:
+            participants = self._get_participants('/', room)
+            return next(iter(participants), None) is not None
+        except KeyError:
+            return False
+
+    def _emit_output(self, session_id, output):
+        """Emit one consolidated output frame to the session's rooms.
+
+        JSON subscribers (the default) get the classic ``output`` event;
+        clients that joined with ``binary: true`` sit in the ``:bin`` room
+        and get the payload as one binary frame — no JSON string-escaping
+        of control characters, roughly halving bytes on the wire for
+        escape-heavy output. Each encoding is skipped entirely when its
+        room is empty.
+        """
+        if self._socketio is None:
+            emit('output', {
+                'session_id': session_id,
+                'data': output
+            }, room=session_id, namespace='/')
+            return
+
+        if self._room_has_members(session_id):
+            # The template dict is only touched from the emit loop, and
+            # emit has serialized it by the time it returns
+            payload = self._payload
+            payload['session_id'] = session_id
+            payload['data'] = output
+            self._emit('output', payload, room=session_id)
+
+        bin_room = session_id + ':bin'
+        if self._room_has_members(bin_room):
+            self._emit(
+                'output_bin',
+                session_id.encode('ascii') + b'\x00' + output.encode('utf-8'),
+                room=bin_room)
+    
+    # How often the orphaned-directory sweep runs; leftover directories
+    # only appear after crashes, so this needn't ride the expiry schedule
+    ORPHAN_SWEEP_INTERVAL = 600
+
+    def _schedule_expiry(self, session_id):
+        """Put a session on the expiry heap and wake the cleanup thread."""
+        deadline = time.time() + self.inactive_timeout
+        with self._deadlines_lock:
+            heapq.heappush(self._deadlines, (deadline, session_id))
+        self._cleanup_wake.set()
+
+    def _cleanup_loop(self):
+        """
+        Background thread that terminates sessions at their idle deadline.
+
+        Sleeps until the earliest scheduled deadline (or the next orphan
+        sweep) rather than waking every minute to scan all sessions; a
+        session that saw activity since scheduling is simply pushed back
+        with its refreshed deadline when it pops.
+        """
+        next_sweep = time.time() + self.ORPHAN_SWEEP_INTERVAL
+        while True:
+            try:
+                now = time.time()
+                with self._deadlines_lock:
+                    earliest = self._deadlines[0][0] if self._deadlines else None
+                wait = next_sweep - now
+                if earliest is not None:
+                    wait = min(wait, earliest - now)
+                if wait > 0:
+                    self._cleanup_wake.wait(wait)
+                self._cleanup_wake.clear()
+
+                now = time.time()
+                self._expire_due_sessions(now)
+                if now >= next_sweep:
+                    self.cleanup_orphaned_directories()
+                    next_sweep = now + self.ORPHAN_SWEEP_INTERVAL
             except Exception as e:
                 logger.error(f"Error in cleanup thread: {str(e)}")
-            
-            # Sleep for a minute before checking again
-            time.sleep(60)
+                time.sleep(60)
+
+    def _expire_due_sessions(self, now):
+        """Terminate sessions whose idle deadline has truly passed."""
+        while True:
+            with self._deadlines_lock:
+                if not self._deadlines or self._deadlines[0][0] > now:
+                    break
+                _deadline, session_id = heapq.heappop(self._deadlines)
+
+            session = self.get_session(session_id)
+            if session is None:
+                continue
+
+            # Lazy invalidation: the heap entry is from session creation or
+            # an earlier requeue; if there was activity since, requeue at
+            # the refreshed deadline instead of terminating
+            idle_deadline = session.last_activity + self.inactive_timeout
+            if idle_deadline > now:
+                with self._deadlines_lock:
+                    heapq.heappush(self._deadlines, (idle_deadline, session_id))
+                continue
+
+            try:
+                logger.info(f"Cleaning up inactive session: {session_id}")
+                self.terminate_session(session_id, remove_files=True)
+            except Exception as e:
+                logger.error(f"Error terminating inactive session: {str(e)}")
     
-    def _cleanup_orphaned_session_directories(self):
+    def cleanup_inactive_sessions(self):
+        """
+        Run a single cleanup pass over sessions that have been inactive
+        longer than the timeout.
+        
+        Returns:
+            int: Number of sessions terminated
+        """
+        current_time = time.time()
+        sessions_to_terminate = []
+
+        # Iterate an atomic snapshot; no lock needed, and the active flag
+        # plus terminate_session's own checks handle any session that is
+        # torn down concurrently
+        for session_id, session in list(self.sessions.items()):
+            # If session is inactive for more than the timeout, add to cleanup list
+            if current_time - session.last_activity > self.inactive_timeout:
+                sessions_to_terminate.append(session_id)
+        
+        # Terminate sessions outside the lock to avoid deadlocks
+        terminated_count = 0
+        for session_id in sessions_to_terminate:
+            try:
+                logger.info(f"Cleaning up inactive session: {session_id}")
+                self.terminate_session(session_id, remove_files=True)
+                terminated_count += 1
+            except Exception as e:
+                logger.error(f"Error terminating inactive session: {str(e)}")
+        
+        return terminated_count
+    
+    def cleanup_orphaned_directories(self):
         """
         Clean up any session directories that don't have corresponding active sessions.
+        
+        Returns:
+            int: Number of orphaned directories removed
         """
+        removed_count = 0
         try:
             # Skip if the base directory doesn't exist yet
             if not os.path.exists(self.users_base_dir):
-                return
+                return removed_count
                 
-            active_session_ids = set()
-            with self.session_lock:
-                active_session_ids = set(self.sessions.keys())
+            # Atomic snapshot of the key view; no lock needed
+            active_session_ids = set(self.sessions.keys())
             
-            # List directories in the users base directory
-            for dir_name in os.listdir(self.users_base_dir):
-                dir_path = os.path.join(self.users_base_dir, dir_name)
-                
-                # If this is a directory and not in our active sessions, it's orphaned
-                if os.path.isdir(dir_path) and dir_name not in active_session_ids:
-                    try:
-                        # Check if the directory is older than the inactive_timeout
-                        dir_stat = os.stat(dir_path)
-                        dir_age = time.time() - dir_stat.st_mtime
-                        
-                        if dir_age > self.inactive_timeout:
-                            logger.info(f"Removing orphaned session directory: {dir_name}")
-                            shutil.rmtree(dir_path)
-                    except Exception as e:
-                        logger.error(f"Error removing orphaned directory {dir_path}: {str(e)}")
+            # Scan the users base directory; DirEntry carries the type and
+            # stat info from the directory read, avoiding a stat per entry.
+            # Collect candidates first so the directory handle is closed
+            # before any rmtree starts mutating its contents.
+            cutoff = time.time() - self.inactive_timeout
+            orphans = []
+            with os.scandir(self.users_base_dir) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    # A removal handed off by an earlier sweep that never
+                    # finished (e.g. crash mid-delete): resume it, unless
+                    # its rmtree is still running on the pool
+                    if entry.name.endswith('.deleting'):
+                        self._submit_remove_tree(entry.path)
+                        continue
+                    # A directory without a corresponding active session
+                    # that is older than the inactive timeout is orphaned
+                    if (entry.name not in active_session_ids
+                            and entry.stat().st_mtime < cutoff):
+                        orphans.append((entry.name, entry.path))
+
+            for dir_name, dir_path in orphans:
+                try:
+                    # Atomic rename takes the directory out of future scans
+                    # in one syscall; the actual tree walk happens on the
+                    # removal pool
+                    doomed = dir_path + '.deleting'
+                    os.rename(dir_path, doomed)
+                    logger.info(f"Removing orphaned session directory: {dir_name}")
+                    self._submit_remove_tree(doomed)
+                    removed_count += 1
+                except Exception as e:
+                    logger.error(f"Error removing orphaned directory {dir_path}: {str(e)}")
         
         except Exception as e:
-            logger.error(f"Error in cleanup_orphaned_session_directories: {str(e)}")
+            logger.error(f"Error in cleanup_orphaned_directories: {str(e)}")
+
+        return removed_count
+
+    def _submit_remove_tree(self, dir_path):
+        """Queue a sentinel directory for removal unless one is in flight."""
+        with self._gc_inflight_lock:
+            if dir_path in self._gc_inflight:
+                return
+            self._gc_inflight.add(dir_path)
+        self._gc_pool.submit(self._remove_tree, dir_path)
+
+    def _remove_tree(self, dir_path):
+        """Delete a renamed-away directory tree on the removal pool."""
+        try:
+            shutil.rmtree(dir_path)
+        except Exception as e:
+            logger.error(f"Error removing directory {dir_path}: {str(e)}")
+        finally:
+            with self._gc_inflight_lock:
+                self._gc_inflight.discard(dir_path)
     
     def get_session_files(self, session_id, path=None):
         """
@@ -277,9 +575,14 @@ class TerminalService:
         if path is None:
             target_path = session.user_files
         else:
-            # Make sure the path is within the user's files directory
+            # Make sure the path is within the user's files directory,
+            # comparing against the abspath cached on the session; the
+            # os.sep-anchored check also rejects sibling directories that
+            # merely share the prefix
             target_path = os.path.join(session.user_files, path.lstrip('/'))
-            if not os.path.abspath(target_path).startswith(os.path.abspath(session.user_files)):
+            target_abs = os.path.abspath(target_path)
+            if (target_abs != session.user_files_abs
+                    and not target_abs.startswith(session.user_files_abs + os.sep)):
                 raise Exception("Invalid path")
         
         if not os.path.exists(target_path):
@@ -289,21 +592,36 @@ class TerminalService:
             raise Exception("Path is not a directory")
         
         files = []
-        for item in os.listdir(target_path):
-            item_path = os.path.join(target_path, item)
-            item_stat = os.stat(item_path)
-            
-            rel_path = os.path.relpath(item_path, session.user_files)
-            if rel_path == '.':
-                rel_path = ''
-                
-            files.append({
-                'name': item,
-                'path': rel_path,
-                'is_dir': os.path.isdir(item_path),
-                'size': item_stat.st_size,
-                'modified': item_stat.st_mtime,
-                'created': item_stat.st_ctime
-            })
-        
+        # Every entry path is <user_files>/<relative>, so the relative path
+        # is a fixed-offset slice; os.path.relpath would re-split and
+        # re-join both paths for every entry
+        rel_start = len(session.user_files.rstrip(os.sep)) + 1
+        # scandir hands back type and stat info from the directory read
+        # itself, so each entry costs one syscall instead of three
+        with os.scandir(target_path) as entries:
+            for entry in entries:
+                item_stat = entry.stat()
+
+                files.append({
+                    'name': entry.name,
+                    'path': entry.path[rel_start:],
+                    'is_dir': entry.is_dir(),
+                    'size': item_stat.st_size,
+                    'modified': item_stat.st_mtime,
+                    'created': item_stat.st_ctime
+                })
+
         return files
+
+
+@functools.lru_cache(maxsize=None)
+def get_terminal_service():
+    """Get the singleton terminal service instance.
+
+    Every module must resolve the service through this factory. Separate
+    instances each own their own sessions dict, cleanup thread, expiry heap
+    and emit queue, so a session created through one (e.g. the REST API)
+    would be invisible to the others (WebSocket join, WebDAV credentials,
+    maintenance cleanup).
+    """
+    return TerminalService()
@@ -1,32 +1,24 @@
 import os
+import re
+import functools
+import hashlib
+import hmac
+import secrets
 import logging
 import json
+import threading
 import time
+from collections import OrderedDict
 from wsgidav.wsgidav_app import WsgiDAVApp
-from wsgidav.fs_dav_provider import FilesystemProvider
-
-# Import compatibility layer to handle different wsgidav versions
-try:
-    # Try newer module structure
-    from wsgidav.dav_provider import DAVProvider
-    from wsgidav.dav_error import DAVError
-    from wsgidav.dc.base_dc import BaseDomainController
-except ImportError:
-    # Fall back to older module structure
-    logger = logging.getLogger(__name__)
-    logger.info("Using older WsgiDAV module structure")
-    # In older versions, these may be directly in wsgidav module
-    from wsgidav import DAVProvider
-    from wsgidav import DAVError
-    try:
-        from wsgidav.domaincontroller import BaseDomainController
-    except ImportError:
-        # For very old versions
-        from wsgidav.domaincontroller import AbstractDomainController as BaseDomainController
-
-from werkzeug.security import check_password_hash, generate_password_hash
-from werkzeug.middleware.dispatcher import DispatcherMiddleware
-from flask import Flask, request, Response
+from wsgidav.fs_dav_provider import FilesystemProvider, FolderResource, FileResource
+from wsgidav import util as dav_util
+
+# wsgidav is pinned in requirements.txt, so the module layout is known at
+# build time; no multi-version import fallbacks
+from wsgidav.dav_provider import DAVProvider
+from wsgidav.dc.base_dc import BaseDomainController
+
+from flask import request
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -35,6 +27,160 @@ logger = logging.getLogger(__name__)
 # This is needed to access credentials from the domain controller
 _webdav_service_instance = None
 
+
+@functools.lru_cache(maxsize=16)
+def _derive_base_url(env_base, host, scheme):
+    """Derive the externally visible base URL for WebDAV credentials.
+
+    Only a handful of (env, host, scheme) combinations ever occur in a
+    deployment, so the f-string assembly is cached rather than rebuilt on
+    every credentials lookup.
+    """
+    if env_base:
+        return env_base
+    if host:
+        return f"{scheme}://{host}"
+    return ''
+
+
+def _is_propfind_listing(environ):
+    """True for the PROPFIND Depth 0/1 requests clients use to browse."""
+    return (environ.get('REQUEST_METHOD') == 'PROPFIND'
+            and environ.get('HTTP_DEPTH', '1') in ('0', '1'))
+
+
+class LitePropfindFileResource(FileResource):
+    """File resource served on the PROPFIND browse path.
+
+    Directory walks only need name/type/size/mtime; reporting no etag
+    support keeps wsgidav from computing and serializing getetag for every
+    child of every listed directory. GET and other methods still go through
+    the full FileResource, so download validation keeps its etag.
+    """
+
+    def support_etag(self):
+        return False
+
+
+class CachedFolderResource(FolderResource):
+    """Folder resource whose member listing is cached by directory mtime.
+
+    WebDAV clients (Finder, the Windows redirector) re-issue PROPFIND for
+    the same directories constantly; each listing re-walks the directory.
+    Listings are built with one os.scandir pass — whose DirEntry type info
+    comes from the directory read itself, replacing the isdir/isfile stat
+    pair the stock listdir path issues per entry — and cached on the owning
+    provider keyed by path, validated against the directory's st_mtime_ns.
+    A repeat PROPFIND of an unchanged directory costs one os.stat, and any
+    change invalidates the entry naturally.
+    """
+
+    def _scan_members(self):
+        """Scan the folder once, returning (names, {name: is_dir})."""
+        names = []
+        kinds = {}
+        with os.scandir(self._file_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        kinds[entry.name] = True
+                    elif entry.is_file():
+                        kinds[entry.name] = False
+                    else:
+                        # Skip non files (links and mount points)
+                        continue
+                except OSError:
+                    continue
+                names.append(entry.name)
+        return names, kinds
+
+    def _cache_lookup(self):
+        """Return the valid cache entry for this folder, or None."""
+        provider = self._fs_provider
+        try:
+            mtime_ns = os.stat(self._file_path).st_mtime_ns
+        except OSError:
+            return None, None
+        with provider._member_cache_lock:
+            cached = provider._member_cache.get(self._file_path)
+            if cached is not None and cached[0] == mtime_ns:
+                provider._member_cache.move_to_end(self._file_path)
+                return cached, mtime_ns
+        return None, mtime_ns
+
+    def get_member_names(self):
+        cached, mtime_ns = self._cache_lookup()
+        if cached is not None:
+            return cached[1]
+        if mtime_ns is None:
+            # Folder vanished under us; let the base class raise normally
+            return super().get_member_names()
+
+        names, kinds = self._scan_members()
+
+        provider = self._fs_provider
+        with provider._member_cache_lock:
+            provider._member_cache[self._file_path] = (mtime_ns, names, kinds)
+            provider._member_cache.move_to_end(self._file_path)
+            while len(provider._member_cache) > provider._member_cache_max:
+                provider._member_cache.popitem(last=False)
+
+        return names
+
+    def get_member(self, name):
+        # Reuse the type information gathered by the scandir pass (PROPFIND
+        # calls get_member right after get_member_names), skipping the
+        # isdir/isfile stat pair the base implementation issues per child
+        cached, _mtime_ns = self._cache_lookup()
+        if cached is None:
+            return super().get_member(name)
+        is_dir = cached[2].get(name)
+        if is_dir is None:
+            return super().get_member(name)
+
+        fp = os.path.join(self._file_path, name)
+        path = dav_util.join_uri(self.path, name)
+        if is_dir:
+            res = FolderResource(path, self.environ, fp)
+            res.__class__ = CachedFolderResource
+            res._fs_provider = self._fs_provider
+        else:
+            res = FileResource(path, self.environ, fp)
+            if _is_propfind_listing(self.environ):
+                res.__class__ = LitePropfindFileResource
+        return res
+
+
+class CachedFilesystemProvider(FilesystemProvider):
+    """FilesystemProvider whose folder resources cache member listings.
+
+    The cache is keyed by absolute directory path, so one cache (plus its
+    lock) can be shared by every per-session provider instead of each
+    provider carrying its own; the session router passes a shared store in.
+    A provider object then holds nothing beyond its root path.
+    """
+
+    def __init__(self, root_folder_path, member_cache=None, member_cache_lock=None):
+        super().__init__(root_folder_path)
+        self._member_cache = member_cache if member_cache is not None else OrderedDict()
+        self._member_cache_max = 4096
+        self._member_cache_lock = member_cache_lock or threading.Lock()
+
+    def get_resource_inst(self, path, environ):
+        res = super().get_resource_inst(path, environ)
+        if res is not None:
+            if res.is_collection:
+                # FolderResource adds no state beyond its base, so retagging
+                # the instance is enough to route listings through the
+                # cache. The resource's own .provider comes from the environ
+                # (the session router), so the owning filesystem provider is
+                # attached explicitly for cache access.
+                res.__class__ = CachedFolderResource
+                res._fs_provider = self
+            elif _is_propfind_listing(environ):
+                res.__class__ = LitePropfindFileResource
+        return res
+
 # Create a proper domain controller class that inherits from BaseDomainController
 # and accepts wsgidav_app and config as required by the library
 class TermuxDomainController(BaseDomainController):
@@ -46,6 +192,14 @@ class TermuxDomainController(BaseDomainController):
         # so we access it through the global variable
         global _webdav_service_instance
         self.webdav_service = _webdav_service_instance
+        # Resolve availability once here rather than probing with hasattr on
+        # every auth request; the service is always constructed before its
+        # WsgiDAVApp (get_wsgi_app sets the global), so a missing service is
+        # a startup-order bug worth failing loudly on.
+        if self.webdav_service is None:
+            raise RuntimeError(
+                "WebDAVService instance not available; the domain controller "
+                "must be created via WebDAVService.get_wsgi_app()")
         logger.info("TermuxDomainController initialized")
     
     def get_domain_realm(self, path_info, environ):
@@ -58,10 +212,9 @@ class TermuxDomainController(BaseDomainController):
     
     def is_realm_user(self, realm, user_name, environ):
         """Check if user has access to realm."""
-        if not self.webdav_service or not hasattr(self.webdav_service, 'credentials'):
-            logger.error("WebDAV service not available in domain controller")
-            return False
-        return user_name in self.webdav_service.credentials
+        # WebDAV usernames are session IDs, so the lock-free frozenset
+        # snapshot answers membership without touching the credentials dict
+        return self.webdav_service.has(user_name)
     
     def get_realm_user_password(self, realm, user_name, environ):
         """Return the stored password for the user name (plaintext)."""
@@ -70,15 +223,9 @@ class TermuxDomainController(BaseDomainController):
     
     def auth_domain_user(self, realm, user_name, password, environ):
         """Return True if user has access to realm with given password."""
-        if not self.webdav_service or not hasattr(self.webdav_service, 'credentials'):
-            logger.error("WebDAV service not available in domain controller")
-            return False
-            
-        if user_name not in self.webdav_service.credentials:
-            return False
-        
-        # Check password using werkzeug's secure password checking
-        return check_password_hash(self.webdav_service.credentials[user_name]["password_hash"], password)
+        # Delegate to the service, which caches recent verdicts so repeat
+        # Basic Auth requests skip the expensive hash check
+        return self.webdav_service.check_auth(user_name, password)
         
     # Additional methods required by the WsgiDAV interface
     def basic_auth_user(self, realm, user_name, password, environ):
@@ -117,11 +264,49 @@ class WebDAVService:
         
         # Dictionary to store session credentials
         # {session_id: {"username": session_id, "password_hash": hashed_password}}
+        # Treated as immutable: add/remove rebuild and rebind a fresh dict
+        # (copy-on-write) under _creds_lock, so readers see a consistent
+        # snapshot via a single atomic attribute load and never take a lock.
         self.credentials = {}
-        
+
         # Dictionary to store session-specific random passwords
-        # {session_id: cleartext_password} - only kept for returning to the user
+        # {session_id: cleartext_password} - only kept for returning to the
+        # user; same copy-on-write discipline as credentials
         self.session_passwords = {}
+
+        # Immutable snapshot of the registered session IDs, rebuilt together
+        # with the credential dicts for lock-free membership tests
+        self._ids_snapshot = frozenset()
+
+        # Serializes writers only; readers never touch it
+        self._creds_lock = threading.Lock()
+
+        # Key for HMAC-hashing session tokens. WebDAV passwords here are
+        # 96-bit random tokens, not user-chosen secrets, so a keyed SHA256
+        # is cryptographically sufficient and orders of magnitude cheaper
+        # than a password KDF. Kept only in memory; credentials don't
+        # outlive the process.
+        self._token_key = secrets.token_bytes(32)
+
+        # LRU of recent auth verdicts keyed by (username, sha256(password)).
+        # WebDAV clients resend Basic Auth credentials on every request;
+        # caching keeps repeat verifications to a dict lookup. Failures are
+        # cached too, so a bad-password flood can't force repeated hashing.
+        self._auth_cache = OrderedDict()
+        self._auth_cache_max = 1024
+        self._auth_cache_ttl = 300
+        self._auth_cache_lock = threading.Lock()
+
+        # Negative cache for credential sprays: usernames with repeated
+        # failures get an exponential backoff window during which auth
+        # short-circuits to False without touching the hash path. The grace
+        # threshold keeps a client that mistypes once (or races a 401
+        # re-prompt) from being locked out.
+        # {user_name: (fail_count, next_allowed_monotonic)}
+        self._neg_cache = OrderedDict()
+        self._neg_cache_max = 1024
+        self._neg_cache_grace = 3
+        self._neg_cache_backoff_cap = 30
         
         # Create the WebDAV WSGI app
         self.webdav_app = self._create_webdav_app()
@@ -165,12 +350,17 @@ class WebDAVService:
             "simple_dc": {
                 "user_mapping": {},  # We'll handle auth in domain_controller
             },
-            "verbose": 2,
+            # Per-request log records are pure hot-path overhead in
+            # production; raise via WEBDAV_VERBOSE when debugging
+            "verbose": int(os.environ.get('WEBDAV_VERBOSE', '1')),
             "logging": {
                 "enable_loggers": []  # Updated from deprecated enable_loggers
             },
-            "property_manager": True,  # True: use property_manager.PropertyManager
-            "lock_storage": True,  # Updated from deprecated lock_manager
+            # Dead props and WebDAV locks are unused by this read-dominant
+            # workload (terminal file browsing); leaving the in-memory
+            # stores enabled adds a locked dict access per PROPFIND/PUT
+            "property_manager": False,
+            "lock_storage": False,
         }
         
         logger.info("Creating WebDAV app with TermuxDomainController class")
@@ -199,13 +389,23 @@ class WebDAVService:
             based on the authenticated user.
             """
             
+            # Upper bound on cached per-session providers; the LRU evicts
+            # beyond this, so memory stays bounded on long-running servers
+            # without a periodic full scan of the cache
+            MAX_PROVIDERS = 512
+
             def __init__(self):
                 super(SessionAwareProvider, self).__init__()
                 self.terminal_service = terminal_service
-                # Cache of session providers to improve performance
-                self.session_providers = {}
-                # Last cleanup time for cache
-                self.last_cleanup = time.time()
+                # Bounded LRU cache of session providers: hits refresh
+                # recency, inserts evict the least recently used entry
+                self.session_providers = OrderedDict()
+                self._providers_lock = threading.Lock()
+                # One listing cache shared by all session providers (keys
+                # are absolute paths, unique across sessions), so cached
+                # state is O(1) bounded stores rather than one per session
+                self._member_cache = OrderedDict()
+                self._member_cache_lock = threading.Lock()
             
             def get_resource_inst(self, path, environ):
                 """Return a DAVResource object for the path.
@@ -230,12 +430,12 @@ class WebDAVService:
             def _get_provider_for_session(self, session_id):
                 """Get or create a file provider for the given session ID."""
                 # Check if we already have a provider for this session
-                if session_id in self.session_providers:
-                    return self.session_providers[session_id]
-                
-                # Periodic cleanup of old providers
-                self._cleanup_old_providers()
-                
+                with self._providers_lock:
+                    provider = self.session_providers.get(session_id)
+                    if provider is not None:
+                        self.session_providers.move_to_end(session_id)
+                        return provider
+
                 # Get the session from the terminal service
                 session = self.terminal_service.get_session(session_id)
                 if not session:
@@ -251,35 +451,28 @@ class WebDAVService:
                     
                     # Create a new file provider for this session
                     logger.info(f"Creating file provider for session {session_id} in {user_files_dir}")
-                    provider = FilesystemProvider(user_files_dir)
-                    
-                    # Store in cache
-                    self.session_providers[session_id] = provider
+                    provider = CachedFilesystemProvider(
+                        user_files_dir,
+                        member_cache=self._member_cache,
+                        member_cache_lock=self._member_cache_lock)
+
+                    # Store in cache, evicting the least recently used
+                    # entries past the bound
+                    with self._providers_lock:
+                        existing = self.session_providers.get(session_id)
+                        if existing is not None:
+                            # A concurrent request beat us to it; reuse its
+                            # provider so both share one instance
+                            self.session_providers.move_to_end(session_id)
+                            return existing
+                        self.session_providers[session_id] = provider
+                        while len(self.session_providers) > self.MAX_PROVIDERS:
+                            self.session_providers.popitem(last=False)
                     return provider
                 except Exception as e:
                     logger.error(f"Error creating provider for session {session_id}: {str(e)}")
                     return None
             
-            def _cleanup_old_providers(self):
-                """Clean up providers for sessions that no longer exist."""
-                # Only clean up every 5 minutes to avoid excessive checking
-                current_time = time.time()
-                if current_time - self.last_cleanup < 300:  # 5 minutes in seconds
-                    return
-                
-                self.last_cleanup = current_time
-                expired_sessions = []
-                
-                # Find sessions that no longer exist
-                for session_id in list(self.session_providers.keys()):
-                    if not self.terminal_service.get_session(session_id):
-                        expired_sessions.append(session_id)
-                
-                # Remove expired sessions from cache
-                for session_id in expired_sessions:
-                    logger.info(f"Removing provider for expired session: {session_id}")
-                    del self.session_providers[session_id]
-            
             # Required DAVProvider methods
             def get_resource_inst_by_href(self, href, environ):
                 """Get a resource by its href."""
@@ -315,13 +508,114 @@ class WebDAVService:
                 # We don't support direct property setting
                 pass
         
-        # Return an instance of the SessionAwareProvider
-        return SessionAwareProvider()
+        # Return an instance of the SessionAwareProvider, releasing its
+        # cached per-session provider as soon as a session is terminated —
+        # O(1) per session end — rather than waiting for LRU eviction
+        provider = SessionAwareProvider()
+
+        def _drop_session_provider(session_id):
+            with provider._providers_lock:
+                provider.session_providers.pop(session_id, None)
+
+        terminal_service.register_terminate_callback(_drop_session_provider)
+        return provider
     
     # We've moved domain controller methods to the TermuxDomainController class
     
     # Session credential management
-    
+
+    def _hash_token(self, password):
+        """Hash a session token with the in-memory HMAC key.
+
+        Args:
+            password (str): The cleartext token
+
+        Returns:
+            str: Hex digest of the keyed hash
+        """
+        return hmac.new(self._token_key, password.encode(), hashlib.sha256).hexdigest()
+
+    def check_auth(self, user_name, password):
+        """
+        Verify a session's WebDAV password, caching recent verdicts.
+
+        The first verification for a (user, password) pair computes the
+        keyed hash; repeats within the TTL are a dict lookup. The cache key
+        uses a sha256 of the submitted password so cleartext never sits in
+        the cache.
+
+        Args:
+            user_name (str): The session ID used as the WebDAV username
+            password (str): The submitted password
+
+        Returns:
+            bool: True if the password is valid for the session
+        """
+        now = time.monotonic()
+
+        # Backoff check first: a sprayed username is rejected on a dict
+        # lookup before any hashing, and before the unknown-user branch so
+        # probing can't distinguish the two by timing
+        neg = self._neg_cache.get(user_name)
+        if neg is not None and neg[0] > self._neg_cache_grace and now < neg[1]:
+            return False
+
+        entry = self.credentials.get(user_name)
+        if entry is None:
+            self._record_auth_failure(user_name, now)
+            return False
+
+        key = (user_name, hashlib.sha256(password.encode()).digest())
+
+        with self._auth_cache_lock:
+            cached = self._auth_cache.get(key)
+            if cached is not None and now < cached[1]:
+                self._auth_cache.move_to_end(key)
+                if cached[0]:
+                    self._neg_cache.pop(user_name, None)
+                return cached[0]
+
+        # Hash outside the lock so concurrent requests don't serialize on it
+        result = hmac.compare_digest(entry["password_hash"], self._hash_token(password))
+
+        with self._auth_cache_lock:
+            self._auth_cache[key] = (result, now + self._auth_cache_ttl)
+            self._auth_cache.move_to_end(key)
+            while len(self._auth_cache) > self._auth_cache_max:
+                self._auth_cache.popitem(last=False)
+            if result:
+                self._neg_cache.pop(user_name, None)
+
+        if not result:
+            self._record_auth_failure(user_name, now)
+
+        return result
+
+    def _record_auth_failure(self, user_name, now):
+        """Bump the failure count and backoff window for a username."""
+        with self._auth_cache_lock:
+            fails = self._neg_cache.get(user_name, (0, 0))[0] + 1
+            next_allowed = now + min(2 ** fails, self._neg_cache_backoff_cap)
+            self._neg_cache[user_name] = (fails, next_allowed)
+            self._neg_cache.move_to_end(user_name)
+            while len(self._neg_cache) > self._neg_cache_max:
+                self._neg_cache.popitem(last=False)
+
+    def has(self, session_id):
+        """
+        Check whether WebDAV credentials exist for a session.
+
+        Reads an immutable frozenset snapshot, so the check is thread-safe
+        without taking the credentials lock and hashes the session ID once.
+
+        Args:
+            session_id (str): The session ID to check
+
+        Returns:
+            bool: True if the session has WebDAV credentials
+        """
+        return session_id in self._ids_snapshot
+
     def add_session(self, session_id):
         """
         Add a session and generate credentials for WebDAV access.
@@ -332,25 +626,32 @@ class WebDAVService:
         Returns:
             dict: WebDAV access information (url, username, password)
         """
-        if session_id in self.credentials:
-            # Return existing credentials if already registered
-            return self._get_credentials_info(session_id)
-        
-        # Generate a random password for this session
-        import secrets
-        password = secrets.token_urlsafe(12)
-        
-        # Store the password hash
-        self.credentials[session_id] = {
-            "username": session_id,
-            "password_hash": generate_password_hash(password)
-        }
-        
-        # Store the cleartext password temporarily for returning to the user
-        self.session_passwords[session_id] = password
-        
+        # Writers serialize on the lock; the check-then-insert must be
+        # atomic or two concurrent adds could mint different passwords
+        with self._creds_lock:
+            if session_id in self.credentials:
+                # Return existing credentials if already registered
+                return self._get_credentials_info(session_id)
+
+            # Generate a random password for this session
+            password = secrets.token_urlsafe(12)
+
+            # Copy-on-write: build the new dicts, then rebind, so lock-free
+            # readers only ever observe complete snapshots
+            new_credentials = dict(self.credentials)
+            new_credentials[session_id] = {
+                "username": session_id,
+                "password_hash": self._hash_token(password)
+            }
+            new_passwords = dict(self.session_passwords)
+            new_passwords[session_id] = password
+
+            self.credentials = new_credentials
+            self.session_passwords = new_passwords
+            self._ids_snapshot = frozenset(new_credentials)
+
         logger.info(f"Added WebDAV credentials for session: {session_id}")
-        
+
         return self._get_credentials_info(session_id)
     
     def remove_session(self, session_id):
@@ -360,12 +661,24 @@ class WebDAVService:
         Args:
             session_id (str): The session ID to remove
         """
-        if session_id in self.credentials:
-            del self.credentials[session_id]
-        
-        if session_id in self.session_passwords:
-            del self.session_passwords[session_id]
-        
+        with self._creds_lock:
+            # pop on the copy folds the membership check and the delete
+            # into one hash lookup per dict; rebind only when something
+            # actually changed so readers keep the old snapshot otherwise
+            new_credentials = dict(self.credentials)
+            if new_credentials.pop(session_id, None) is not None:
+                self.credentials = new_credentials
+                self._ids_snapshot = frozenset(new_credentials)
+
+            new_passwords = dict(self.session_passwords)
+            if new_passwords.pop(session_id, None) is not None:
+                self.session_passwords = new_passwords
+
+        # Drop any cached auth verdicts for the removed session
+        with self._auth_cache_lock:
+            for key in [k for k in self._auth_cache if k[0] == session_id]:
+                del self._auth_cache[key]
+
         logger.info(f"Removed WebDAV credentials for session: {session_id}")
     
     def _get_credentials_info(self, session_id):
@@ -381,17 +694,17 @@ class WebDAVService:
         if session_id not in self.credentials or session_id not in self.session_passwords:
             return None
         
-        # Get base URL from environment variable or use the request host
-        # We need a publicly accessible URL for WebDAV
-        base_url = os.environ.get('WEBDAV_BASE_URL', '')
-        
-        # If no base URL set, try to determine from request
-        if not base_url:
-            if request:
-                host = request.headers.get('Host', request.host)
-                scheme = request.environ.get('wsgi.url_scheme', 'http')
-                base_url = f"{scheme}://{host}"
-        
+        # Get base URL from environment variable or use the request host;
+        # we need a publicly accessible URL for WebDAV. The request proxy
+        # deref happens once here, and the derived URL for the resulting
+        # (env, host, scheme) tuple comes from the lru_cache helper.
+        env_base = os.environ.get('WEBDAV_BASE_URL', '')
+        host = scheme = ''
+        if not env_base and request:
+            host = request.headers.get('Host', request.host)
+            scheme = request.environ.get('wsgi.url_scheme', 'http')
+        base_url = _derive_base_url(env_base, host, scheme)
+
         # Construct WebDAV url at the /webdav endpoint
         webdav_url = f"{base_url}/webdav" if base_url else "/webdav"
         
@@ -412,8 +725,27 @@ def mount_webdav_to_flask_app(app, webdav_service, mount_path='/webdav'):
         webdav_service: The WebDAVService instance
         mount_path: The URL path to mount WebDAV on
     """
-    # Create a dispatcher middleware that routes requests to either Flask or WebDAV
+    # Route requests to either Flask or WebDAV with a small closure instead
+    # of DispatcherMiddleware: with a single mount, the middleware's generic
+    # sorted-prefix walk and script-name slicing are overhead every request
+    # (Flask and WebDAV alike) pays. One startswith against a bound local
+    # does the same job.
     webdav_wsgi_app = webdav_service.get_wsgi_app()
-    app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {mount_path: webdav_wsgi_app})
-    
+    flask_wsgi_app = app.wsgi_app
+    prefix = mount_path.rstrip('/')
+    # One precompiled match covers both the bare mount path and anything
+    # under it, and stays a single C-level call if more mounts are ever
+    # folded into the pattern
+    match_mount = re.compile(re.escape(prefix) + r'(?=/|$)').match
+
+    def dispatch(environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if match_mount(path):
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+            environ['PATH_INFO'] = path[len(prefix):] or '/'
+            return webdav_wsgi_app(environ, start_response)
+        return flask_wsgi_app(environ, start_response)
+
+    app.wsgi_app = dispatch
+
     logger.info(f"WebDAV mounted at {mount_path}")
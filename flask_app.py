@@ -1,97 +1,137 @@
 #!/usr/bin/env python3
 
+# Monkey-patch before ANY other import. If another module is imported first
+# and caches a reference to the unpatched socket/ssl/subprocess, cooperative
+# scheduling breaks for that module and its blocking calls stall the whole
+# worker (e.g. pip subprocess runs in python_api).
+import gevent.monkey
+gevent.monkey.patch_all()
+
 import os
 import sys
+import types
+
+import orjson
 
-# Try to use gevent first (more compatible with Python 3.11 on Render),
-# fall back to other options if not available
+# Pin the async mode explicitly instead of picking it by trial import.
+# A silent fallback can leave Socket.IO in a mode that doesn't match the
+# gunicorn worker class, which downgrades every connection to HTTP
+# long-polling and blocks the single worker for seconds per request.
+# The production entry point must use the matching worker class:
+#   gunicorn --worker-class gevent -w 1 wsgi:app  (see render.yaml)
 async_mode = 'gevent'
-try:
-    import gevent
-    import gevent.monkey
-    gevent.monkey.patch_all()
-    print("Using gevent for async mode")
-except ImportError:
-    try:
-        import eventlet
-        # Use eventlet as fallback (may have issues on Python 3.11)
-        eventlet.monkey_patch()
-        async_mode = 'eventlet'
-        print("Using eventlet for async mode")
-    except ImportError:
-        print("Neither gevent nor eventlet is available. Using threading mode.")
-        async_mode = 'threading'
 
 from flask import Flask, jsonify
 from flask_socketio import SocketIO
 from dotenv import load_dotenv
 
-# Load environment variables from .env file if present
-load_dotenv()
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev_key_for_websocket_secure_connection')
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max upload size
-
-# Initialize SocketIO with CORS allowed for the iOS app
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode=async_mode)
-
-# Import and register API routes
-from app.api.terminal_api import terminal_api
-from app.api.files_api import files_api
-from app.api.python_api import python_api
-from app.api.maintenance_api import maintenance_api
-# Re-enabled WebDAV API with fixed implementation
-from app.api.webdav_api import webdav_api
-
-app.register_blueprint(terminal_api)
-app.register_blueprint(files_api)
-app.register_blueprint(python_api)
-app.register_blueprint(maintenance_api)
-app.register_blueprint(webdav_api)
-
-# Import and register WebSocket handlers
-from app.api.terminal_ws import register_socket_events
-from app.api.webdav_ws import register_webdav_socket_events
-register_socket_events(socketio)
-register_webdav_socket_events(socketio)
-
-# Re-enabled WebDAV mounting with fixed implementation
-from app.api.webdav_api import get_webdav_service
-from app.services.webdav_service import mount_webdav_to_flask_app
-
-# Mount WebDAV at /webdav endpoint
-mount_webdav_to_flask_app(app, get_webdav_service())
-
-# Create a root endpoint that shows API status and version
-@app.route('/')
-def index():
-    return jsonify({
-        'name': 'Termux Web API',
-        'version': '1.0.0',
-        'status': 'running',
-        'endpoints': [
-            '/api/terminal/sessions',
-            '/api/files',
-            '/api/python/packages',
-            '/api/python/venvs',
-            '/api/python/run',
-            '/api/maintenance/cleanup'
-        ]
-    })
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(e):
-    return jsonify({'error': 'Endpoint not found'}), 404
-
-@app.errorhandler(500)
-def server_error(e):
-    return jsonify({'error': 'Internal server error'}), 500
+# orjson-backed serializer for Socket.IO framing; terminal output streams
+# spend real CPU in JSON encoding, so the C encoder pays off per frame.
+# python-socketio passes encoder kwargs (separators etc.) that orjson does
+# not take, hence the wrapper.
+_socketio_json = types.SimpleNamespace(
+    dumps=lambda obj, **kwargs: orjson.dumps(obj).decode(),
+    loads=orjson.loads,
+)
+
+
+def create_app():
+    """Build and wire the Flask app and its Socket.IO server.
+
+    Blueprint, WebSocket and WebDAV imports happen inside the factory so
+    importing this module for create_app alone (scripts, profiling with
+    -X importtime) doesn't pull the whole service tree; the module-level
+    app below keeps the gunicorn wsgi:app entry point unchanged.
+
+    Returns:
+        tuple: (flask.Flask, flask_socketio.SocketIO)
+    """
+    # Load environment variables from .env file if present
+    load_dotenv()
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev_key_for_websocket_secure_connection')
+    app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max upload size
+
+    # Initialize SocketIO with CORS allowed for the iOS app. http_compression
+    # keeps polling-transport payloads deflated, and the explicit ping window
+    # plus a 1MB buffer cap bound per-connection memory.
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=async_mode,
+                        json=_socketio_json,
+                        http_compression=True,
+                        ping_interval=25, ping_timeout=20,
+                        max_http_buffer_size=1 << 20)
+
+    # Fail fast if Socket.IO ended up in a different mode than requested
+    assert socketio.async_mode == async_mode, (
+        f"Socket.IO async mode is {socketio.async_mode!r}, expected {async_mode!r}; "
+        "check that gevent is installed and the gunicorn worker class matches"
+    )
+
+    # Import and register API routes
+    from app.api.terminal_api import terminal_api
+    from app.api.files_api import files_api
+    from app.api.python_api import python_api
+    from app.api.maintenance_api import maintenance_api
+    # Re-enabled WebDAV API with fixed implementation
+    from app.api.webdav_api import webdav_api
+
+    app.register_blueprint(terminal_api)
+    app.register_blueprint(files_api)
+    app.register_blueprint(python_api)
+    app.register_blueprint(maintenance_api)
+    app.register_blueprint(webdav_api)
+
+    # Import and register WebSocket handlers
+    from app.api.terminal_ws import register_socket_events
+    from app.api.webdav_ws import register_webdav_socket_events
+    register_socket_events(socketio)
+    register_webdav_socket_events(socketio)
+
+    # Re-enabled WebDAV mounting with fixed implementation
+    from app.api.webdav_api import get_webdav_service
+    from app.services.webdav_service import mount_webdav_to_flask_app
+
+    # Mount WebDAV at /webdav endpoint
+    mount_webdav_to_flask_app(app, get_webdav_service())
+
+    # Create a root endpoint that shows API status and version
+    @app.route('/')
+    def index():
+        return jsonify({
+            'name': 'Termux Web API',
+            'version': '1.0.0',
+            'status': 'running',
+            'endpoints': [
+                '/api/terminal/sessions',
+                '/api/files',
+                '/api/python/packages',
+                '/api/python/venvs',
+                '/api/python/run',
+                '/api/maintenance/cleanup'
+            ]
+        })
+
+    # Error handlers
+    @app.errorhandler(404)
+    def not_found(e):
+        return jsonify({'error': 'Endpoint not found'}), 404
+
+    @app.errorhandler(500)
+    def server_error(e):
+        return jsonify({'error': 'Internal server error'}), 500
+
+    return app, socketio
+
+
+# The instances gunicorn (via wsgi.py) and the dev server below serve
+app, socketio = create_app()
 
 if __name__ == '__main__':
-    # Use eventlet WSGI server for better WebSocket performance
+    # Development fallback only. Production serves through gunicorn's gevent
+    # worker (see render.yaml: `gunicorn --worker-class gevent -w 1 wsgi:app`),
+    # which matches the pinned async_mode above; socketio.run here is the
+    # single-process dev server.
     port = int(os.getenv('PORT', 5000))
-    print(f"Starting Termux Web API server on port {port}")
+    print(f"Starting Termux Web API server on port {port} (dev server)")
     socketio.run(app, host='0.0.0.0', port=port)